@@ -1,4 +1,8 @@
-from project_starter import MultiAgentWorkflow
+import asyncio
+
+from project_starter import MultiAgentWorkflow, configure_logging, streaming_enabled
+
+configure_logging()
 
 multi_agent_workflow = MultiAgentWorkflow()
 
@@ -18,6 +22,6 @@ I need these supplies delivered by April 15, 2025. Thank you. (Date of request:
 """
 
 
-response = multi_agent_workflow.run(sample_request2)
+response = asyncio.run(multi_agent_workflow.run(sample_request2, streaming=streaming_enabled()))
 
 print(response)
@@ -1,16 +1,77 @@
 import ast
+import asyncio
+import bisect
+import contextlib
+import csv
+import hashlib
+import itertools
+import logging
+import logging.handlers
+import math
+import os
+import re
+import sys
 import time
+from dataclasses import dataclass
 from datetime import datetime, timedelta
+from functools import lru_cache
 from typing import Dict, List, Union
 
 import numpy as np
 import pandas as pd
-from sqlalchemy import create_engine, Engine
+from sqlalchemy import create_engine, event, Engine
 from sqlalchemy.sql import text
 
-# Create an SQLite database
+logger = logging.getLogger(__name__)
+
+# Number of log records held in memory before they are written out together
+LOG_BUFFER_CAPACITY = 256
+
+
+def configure_logging(level: Union[str, int, None] = None) -> None:
+    """
+    Write this module's log records to stdout in batches.
+
+    Records are buffered and flushed every LOG_BUFFER_CAPACITY records, on errors and at exit.
+    Records below the level are discarded before their message is formatted.
+
+    Args:
+        level (str or int, optional): Logging level; defaults to the LOG_LEVEL environment
+            variable, or INFO if it is not set.
+    """
+    # Replace the handler from an earlier call instead of adding a second one
+    for handler in [h for h in logger.handlers if isinstance(h, logging.handlers.MemoryHandler)]:
+        logger.removeHandler(handler)
+        handler.close()
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(
+        logging.handlers.MemoryHandler(LOG_BUFFER_CAPACITY, flushLevel=logging.ERROR, target=stream_handler)
+    )
+
+    if level is None:
+        level = os.getenv("LOG_LEVEL", "INFO")
+    logger.setLevel(level.upper() if isinstance(level, str) else level)
+
+
+# Create an SQLite database; SQLAlchemy's default QueuePool keeps connections open between tool
+# calls, so the per-connection setup (including the PRAGMAs below) runs once per connection
 db_engine = create_engine("sqlite:///munder_difflin.db")
 
+
+@event.listens_for(db_engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Tune every new SQLite connection: WAL journal, relaxed fsync and in-memory temp storage."""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA mmap_size=268435456")
+    cursor.execute("PRAGMA cache_size=-65536")
+    cursor.close()
+
+
 # List containing the different kinds of papers
 paper_supplies = [
     # Paper Types (priced per sheet unless specified)
@@ -68,6 +129,9 @@ paper_supplies = [
     {"item_name": "220 gsm poster paper", "category": "specialty", "unit_price": 0.35},
 ]
 
+# Name-indexed view of the catalogue for O(1) lookups by item name
+PAPER_BY_NAME = {item["item_name"]: item for item in paper_supplies}
+
 
 # Given below are some utility functions you can use to implement your multi-agent system
 
@@ -104,27 +168,27 @@ def generate_sample_inventory(paper_supplies: list, coverage: float = 0.4, seed:
 
     # Randomly select item indices without replacement
     selected_indices = np.random.choice(
-        range(len(paper_supplies)),
+        len(paper_supplies),
         size=num_items,
         replace=False
     )
 
-    # Extract selected items from paper_supplies list
-    selected_items = [paper_supplies[i] for i in selected_indices]
+    # Extract selected items from paper_supplies as column arrays
+    catalog = pd.DataFrame(paper_supplies, columns=["item_name", "category", "unit_price"])
+    selected = catalog.iloc[selected_indices]
 
-    # Construct inventory records
-    inventory = []
-    for item in selected_items:
-        inventory.append({
-            "item_name": item["item_name"],
-            "category": item["category"],
-            "unit_price": item["unit_price"],
-            "current_stock": np.random.randint(200, 800),  # Realistic stock range
-            "min_stock_level": np.random.randint(50, 150)  # Reasonable threshold for reordering
-        })
+    # Draw stock (200–800) and reorder threshold (50–150) for every item in one call;
+    # the broadcast draw consumes the RNG in the same per-item order as scalar draws
+    levels = np.random.randint([200, 50], [800, 150], size=(num_items, 2))
 
     # Return inventory as a pandas DataFrame
-    return pd.DataFrame(inventory)
+    return pd.DataFrame({
+        "item_name": selected["item_name"].to_numpy(),
+        "category": selected["category"].to_numpy(),
+        "unit_price": selected["unit_price"].to_numpy(),
+        "current_stock": levels[:, 0],  # Realistic stock range
+        "min_stock_level": levels[:, 1],  # Reasonable threshold for reordering
+    })
 
 
 def init_database(db_engine: Engine, seed: int = 137) -> Engine:
@@ -137,6 +201,8 @@ def init_database(db_engine: Engine, seed: int = 137) -> Engine:
     - Loads previous quotes from 'quotes.csv' into a 'quotes' table, extracting useful metadata
     - Generates a random subset of paper inventory using `generate_sample_inventory`
     - Inserts initial financial records including available cash and starting stock levels
+    - Creates indexes on the transaction and quote lookup columns once the data is loaded
+    - Builds the 'quote_fts' full-text index over customer requests and quote explanations
 
     Args:
         db_engine (Engine): A SQLAlchemy engine connected to the SQLite database.
@@ -147,97 +213,149 @@ def init_database(db_engine: Engine, seed: int = 137) -> Engine:
         Engine: The same SQLAlchemy engine, after initializing all necessary tables and records.
 
     Raises:
-        Exception: If an error occurs during setup, the exception is printed and raised.
+        Exception: If an error occurs during setup, all changes are rolled back and the exception is logged and raised.
     """
     try:
-        # ----------------------------
-        # 1. Create an empty 'transactions' table schema
-        # ----------------------------
-        transactions_schema = pd.DataFrame({
-            "id": [],
-            "item_name": [],
-            "transaction_type": [],  # 'stock_orders' or 'sales'
-            "units": [],  # Quantity involved
-            "price": [],  # Total price for the transaction
-            "transaction_date": [],  # ISO-formatted date
-        })
-        transactions_schema.to_sql("transactions", db_engine, if_exists="replace", index=False)
-
-        # Set a consistent starting date
-        initial_date = datetime(2025, 1, 1).isoformat()
-
-        # ----------------------------
-        # 2. Load and initialize 'quote_requests' table
-        # ----------------------------
-        quote_requests_df = pd.read_csv("quote_requests.csv")
-        quote_requests_df["id"] = range(1, len(quote_requests_df) + 1)
-        quote_requests_df.to_sql("quote_requests", db_engine, if_exists="replace", index=False)
-
-        # ----------------------------
-        # 3. Load and transform 'quotes' table
-        # ----------------------------
-        quotes_df = pd.read_csv("quotes.csv")
-        quotes_df["request_id"] = range(1, len(quotes_df) + 1)
-        quotes_df["order_date"] = initial_date
-
-        # Unpack metadata fields (job_type, order_size, event_type) if present
-        if "request_metadata" in quotes_df.columns:
-            quotes_df["request_metadata"] = quotes_df["request_metadata"].apply(
-                lambda x: ast.literal_eval(x) if isinstance(x, str) else x
+        # Run every insert on one connection inside a single transaction
+        with db_engine.begin() as conn:
+            # ----------------------------
+            # 1. Create an empty 'transactions' table schema with explicit column types
+            # ----------------------------
+            conn.execute(text("DROP TABLE IF EXISTS transactions"))
+            conn.execute(text("""
+                CREATE TABLE transactions (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    item_name TEXT,
+                    transaction_type TEXT NOT NULL CHECK (transaction_type IN ('stock_orders', 'sales')),
+                    units INTEGER,  -- Quantity involved
+                    price REAL,  -- Total price for the transaction
+                    transaction_date TEXT NOT NULL  -- ISO-formatted date
+                )
+            """))
+
+            # Set a consistent starting date
+            initial_date = datetime(2025, 1, 1).isoformat()
+
+            # ----------------------------
+            # 2. Load and initialize 'quote_requests' table
+            # ----------------------------
+            # Create the table up front so it exists (empty) even when the CSV has no rows
+            conn.execute(text("DROP TABLE IF EXISTS quote_requests"))
+            conn.execute(text("""
+                CREATE TABLE quote_requests (
+                    id INTEGER PRIMARY KEY,
+                    mood TEXT,
+                    job TEXT,
+                    need_size TEXT,
+                    event TEXT,
+                    response TEXT
+                )
+            """))
+
+            # Stream the CSV in chunks so the full file is never held in memory at once
+            try:
+                quote_request_chunks = pd.read_csv("quote_requests.csv", chunksize=10_000)
+            except pd.errors.EmptyDataError:
+                quote_request_chunks = []
+            next_id = 1
+            for quote_requests_df in quote_request_chunks:
+                quote_requests_df["id"] = range(next_id, next_id + len(quote_requests_df))
+                quote_requests_df.to_sql(
+                    "quote_requests", conn, if_exists="append", index=False, method="multi", chunksize=500
+                )
+                next_id += len(quote_requests_df)
+
+            # ----------------------------
+            # 3. Load and transform 'quotes' table
+            # ----------------------------
+            # Read only the relevant source columns
+            quotes_df = pd.read_csv(
+                "quotes.csv",
+                usecols=lambda column: column in {"total_amount", "quote_explanation", "request_metadata"},
             )
-            quotes_df["job_type"] = quotes_df["request_metadata"].apply(lambda x: x.get("job_type", ""))
-            quotes_df["order_size"] = quotes_df["request_metadata"].apply(lambda x: x.get("order_size", ""))
-            quotes_df["event_type"] = quotes_df["request_metadata"].apply(lambda x: x.get("event_type", ""))
-
-        # Retain only relevant columns
-        quotes_df = quotes_df[[
-            "request_id",
-            "total_amount",
-            "quote_explanation",
-            "order_date",
-            "job_type",
-            "order_size",
-            "event_type"
-        ]]
-        quotes_df.to_sql("quotes", db_engine, if_exists="replace", index=False)
-
-        # ----------------------------
-        # 4. Generate inventory and seed stock
-        # ----------------------------
-        inventory_df = generate_sample_inventory(paper_supplies, seed=seed)
-
-        # Seed initial transactions
-        initial_transactions = []
-
-        # Add a starting cash balance via a dummy sales transaction
-        initial_transactions.append({
-            "item_name": None,
-            "transaction_type": "sales",
-            "units": None,
-            "price": 50000.0,
-            "transaction_date": initial_date,
-        })
-
-        # Add one stock order transaction per inventory item
-        for _, item in inventory_df.iterrows():
-            initial_transactions.append({
-                "item_name": item["item_name"],
+            quotes_df.insert(0, "request_id", range(1, len(quotes_df) + 1))
+            quotes_df["order_date"] = initial_date
+
+            # Unpack metadata fields (job_type, order_size, event_type) if present
+            if "request_metadata" in quotes_df.columns:
+                def _parse_metadata(raw) -> tuple:
+                    metadata = ast.literal_eval(raw) if isinstance(raw, str) else (raw or {})
+                    return (
+                        metadata.get("job_type", ""),
+                        metadata.get("order_size", ""),
+                        metadata.get("event_type", ""),
+                    )
+
+                # Parse each metadata string once and extract all three fields in the same pass
+                quotes_df[["job_type", "order_size", "event_type"]] = pd.DataFrame(
+                    quotes_df["request_metadata"].map(_parse_metadata).tolist(),
+                    index=quotes_df.index,
+                )
+
+                # Drop the raw metadata in place; remaining columns are already in table order
+                quotes_df.drop(columns="request_metadata", inplace=True)
+            quotes_df.to_sql("quotes", conn, if_exists="replace", index=False, method="multi", chunksize=500)
+
+            # ----------------------------
+            # 4. Generate inventory and seed stock
+            # ----------------------------
+            inventory_df = generate_sample_inventory(paper_supplies, seed=seed)
+
+            # Add a starting cash balance via a dummy sales transaction
+            cash_df = pd.DataFrame([{
+                "item_name": None,
+                "transaction_type": "sales",
+                "units": None,
+                "price": 50000.0,
+                "transaction_date": initial_date,
+            }])
+
+            # Add one stock order transaction per inventory item (built column-wise, no row loop)
+            stock_df = pd.DataFrame({
+                "item_name": inventory_df["item_name"].values,
                 "transaction_type": "stock_orders",
-                "units": item["current_stock"],
-                "price": item["current_stock"] * item["unit_price"],
+                "units": inventory_df["current_stock"].values,
+                "price": (inventory_df["current_stock"] * inventory_df["unit_price"]).values,
                 "transaction_date": initial_date,
             })
 
-        # Commit transactions to database
-        pd.DataFrame(initial_transactions).to_sql("transactions", db_engine, if_exists="append", index=False)
+            # Commit all seed transactions to database in a single bulk insert
+            initial_transactions = pd.concat([cash_df, stock_df], ignore_index=True)
+            initial_transactions.to_sql(
+                "transactions", conn, if_exists="append", index=False, method="multi", chunksize=500
+            )
 
-        # Save the inventory reference table
-        inventory_df.to_sql("inventory", db_engine, if_exists="replace", index=False)
+            # Save the inventory reference table
+            inventory_df.to_sql("inventory", conn, if_exists="replace", index=False, method="multi", chunksize=500)
+
+            # ----------------------------
+            # 5. Index the hot lookup columns (after the bulk load) and refresh planner stats
+            # ----------------------------
+            conn.execute(text("CREATE INDEX IF NOT EXISTS idx_tx_item_date ON transactions(item_name, transaction_date)"))
+            conn.execute(text("CREATE INDEX IF NOT EXISTS idx_tx_date ON transactions(transaction_date)"))
+            conn.execute(text("CREATE INDEX IF NOT EXISTS idx_q_orderdate ON quotes(order_date)"))
+
+            # Full-text index over request and quote text used by `search_quote_history`
+            conn.execute(text("DROP TABLE IF EXISTS quote_fts"))
+            conn.execute(text(
+                "CREATE VIRTUAL TABLE quote_fts USING fts5(request_id UNINDEXED, response, quote_explanation)"
+            ))
+            conn.execute(text("""
+                INSERT INTO quote_fts (request_id, response, quote_explanation)
+                SELECT q.request_id, qr.response, q.quote_explanation
+                FROM quotes q
+                JOIN quote_requests qr ON q.request_id = qr.id
+            """))
+            conn.execute(text("ANALYZE"))
+
+        # Quote tables were reloaded, so previously memoized searches are stale
+        _query_quote_history.cache_clear()
 
         return db_engine
 
-    except Exception as e:
-        print(f"Error initializing database: {e}")
+    except Exception:
+        # The transaction opened by db_engine.begin() has already been rolled back at this point
+        logger.exception("Error initializing database")
         raise
 
 
@@ -266,8 +384,8 @@ def create_transaction(
         ValueError: If `transaction_type` is not 'stock_orders' or 'sales'.
         Exception: For other database or execution errors.
     """
-    # Debug log (comment out in production if needed)
-    print(f"FUNC (create_transaction): Creating transaction for '{item_name}' ")
+    # Debug log (formatted only when DEBUG is enabled)
+    logger.debug("FUNC (create_transaction): Creating transaction for '%s'", item_name)
 
     try:
         # Convert datetime to ISO string if necessary
@@ -277,24 +395,28 @@ def create_transaction(
         if transaction_type not in {"stock_orders", "sales"}:
             raise ValueError("Transaction type must be 'stock_orders' or 'sales'")
 
-        # Prepare transaction record as a single-row DataFrame
-        transaction = pd.DataFrame([{
-            "item_name": item_name,
-            "transaction_type": transaction_type,
-            "units": quantity,
-            "price": price,
-            "transaction_date": date_str,
-        }])
-
-        # Insert the record into the database
-        transaction.to_sql("transactions", db_engine, if_exists="append", index=False)
+        # Insert the record with a single parameterized statement
+        insert_query = """
+                       INSERT INTO transactions (item_name, transaction_type, units, price, transaction_date)
+                       VALUES (:item_name, :transaction_type, :units, :price, :transaction_date) \
+                       """
+        with db_engine.begin() as conn:
+            result = conn.execute(
+                text(insert_query),
+                {
+                    "item_name": item_name,
+                    "transaction_type": transaction_type,
+                    "units": quantity,
+                    "price": price,
+                    "transaction_date": date_str,
+                },
+            )
 
-        # Fetch and return the ID of the inserted row
-        result = pd.read_sql("SELECT last_insert_rowid() as id", db_engine)
-        return int(result.iloc[0]["id"])
+        # Return the ID of the inserted row
+        return int(result.lastrowid)
 
     except Exception as e:
-        print(f"Error creating transaction: {e}")
+        logger.error("Error creating transaction: %s", e)
         raise
 
 
@@ -313,8 +435,8 @@ def get_all_inventory(as_of_date: str) -> Dict[str, int]:
     Returns:
         Dict[str, int]: A dictionary mapping item names to their current stock levels.
     """
-    # Debug log (comment out in production if needed)
-    print(f"FUNC (get_all_inventory): Fetching inventory as of '{as_of_date}'")
+    # Debug log (formatted only when DEBUG is enabled)
+    logger.debug("FUNC (get_all_inventory): Fetching inventory as of '%s'", as_of_date)
 
     # SQL query to compute stock levels per item as of the given date
     query = """
@@ -331,11 +453,10 @@ def get_all_inventory(as_of_date: str) -> Dict[str, int]:
             HAVING stock > 0 \
             """
 
-    # Execute the query with the date parameter
-    result = pd.read_sql(query, db_engine, params={"as_of_date": as_of_date})
-
-    # Convert the result into a dictionary {item_name: stock}
-    return dict(zip(result["item_name"], result["stock"]))
+    # Execute the query with the date parameter and build {item_name: stock} straight from the rows
+    with db_engine.connect() as conn:
+        result = conn.execute(text(query), {"as_of_date": as_of_date})
+        return {item_name: int(stock) for item_name, stock in result}
 
 
 # INFO: Switched return type to Dict[str, int] cause of pydantic_core._pydantic_core.PydanticSerializationError: Unable to serialize unknown type: <class 'pandas.core.frame.DataFrame'>
@@ -369,19 +490,49 @@ def get_stock_level(item_name: str, as_of_date: Union[str, datetime]) -> dict:
                   WHERE item_name = :item_name
                     AND transaction_date <= :as_of_date \
                   """
-    # Debug log (comment out in production if needed)
-    print(f"FUNC (get_stock_level): Fetching stock for '{item_name}' as of '{as_of_date}'")
+    # Debug log (formatted only when DEBUG is enabled)
+    logger.debug("FUNC (get_stock_level): Fetching stock for '%s' as of '%s'", item_name, as_of_date)
 
-    df = pd.read_sql(
-        stock_query,
-        db_engine,
-        params={"item_name": item_name, "as_of_date": as_of_date},
-    )
+    with db_engine.connect() as conn:
+        row = conn.execute(
+            text(stock_query),
+            {"item_name": item_name, "as_of_date": as_of_date},
+        ).fetchone()
+
+    return {"item_name": item_name, "current_stock": int(row[1] or 0) if row else 0}
+
+
+# Supplier lead times: orders up to each quantity bound ship after the matching number of days
+_DELIVERY_QUANTITY_BOUNDS = (10, 100, 1000)
+_DELIVERY_DAYS = (0, 1, 4, 7)
+
+
+# Delivery dates keyed by (start date, lead time in days) for the start dates of the current batch;
+# replaced by each precompute_supplier_delivery_dates call, so it only holds one batch's dates
+_PRECOMPUTED_DELIVERY_DATES: Dict[tuple, str] = {}
 
-    if df.empty:
-        return {"item_name": item_name, "current_stock": 0}
 
-    return df.iloc[0].to_dict()
+@lru_cache(maxsize=1024)
+def _shift_iso_date(date_str: str, days: int) -> str:
+    """Return `date_str` (YYYY-MM-DD) shifted by `days` days; raises ValueError on invalid dates."""
+    return (datetime.fromisoformat(date_str) + timedelta(days=days)).strftime("%Y-%m-%d")
+
+
+def precompute_supplier_delivery_dates(start_dates: pd.Series) -> None:
+    """
+    Precompute supplier delivery dates for every lead time from each of the given start dates.
+
+    Args:
+        start_dates (pd.Series): Datetime-like start dates, e.g. the request dates of a batch of orders.
+    """
+    start_dates = pd.to_datetime(start_dates.drop_duplicates().dropna())
+    start_date_strs = start_dates.dt.strftime("%Y-%m-%d")
+    _PRECOMPUTED_DELIVERY_DATES.clear()
+    for days in set(_DELIVERY_DAYS):
+        delivery_date_strs = (start_dates + pd.Timedelta(days=days)).dt.strftime("%Y-%m-%d")
+        _PRECOMPUTED_DELIVERY_DATES.update(
+            zip(zip(start_date_strs, itertools.repeat(days)), delivery_date_strs)
+        )
 
 
 def get_supplier_delivery_date(input_date_str: str, quantity: int) -> str:
@@ -401,32 +552,25 @@ def get_supplier_delivery_date(input_date_str: str, quantity: int) -> str:
     Returns:
         str: Estimated delivery date in ISO format (YYYY-MM-DD).
     """
-    # Debug log (comment out in production if needed)
-    print(f"FUNC (get_supplier_delivery_date): Calculating for qty {quantity} from date string '{input_date_str}'")
+    # Debug log (formatted only when DEBUG is enabled)
+    logger.debug(
+        "FUNC (get_supplier_delivery_date): Calculating for qty %s from date string '%s'", quantity, input_date_str
+    )
+
+    # Determine delivery delay based on quantity
+    days = _DELIVERY_DAYS[bisect.bisect_left(_DELIVERY_QUANTITY_BOUNDS, quantity)]
 
-    # Attempt to parse the input date
+    # Add delivery days to the starting date (precomputed for the current batch, otherwise memoized)
     try:
-        input_date_dt = datetime.fromisoformat(input_date_str.split("T")[0])
+        date_str = input_date_str.partition("T")[0]
+        delivery_date = _PRECOMPUTED_DELIVERY_DATES.get((date_str, days))
+        return delivery_date if delivery_date is not None else _shift_iso_date(date_str, days)
     except (ValueError, TypeError):
         # Fallback to current date on format error
-        print(f"WARN (get_supplier_delivery_date): Invalid date format '{input_date_str}', using today as base.")
-        input_date_dt = datetime.now()
-
-    # Determine delivery delay based on quantity
-    if quantity <= 10:
-        days = 0
-    elif quantity <= 100:
-        days = 1
-    elif quantity <= 1000:
-        days = 4
-    else:
-        days = 7
-
-    # Add delivery days to the starting date
-    delivery_date_dt = input_date_dt + timedelta(days=days)
-
-    # Return formatted delivery date
-    return delivery_date_dt.strftime("%Y-%m-%d")
+        logger.warning(
+            "WARN (get_supplier_delivery_date): Invalid date format '%s', using today as base.", input_date_str
+        )
+        return (datetime.now() + timedelta(days=days)).strftime("%Y-%m-%d")
 
 
 def get_cash_balance(as_of_date: Union[str, datetime]) -> float:
@@ -442,34 +586,63 @@ def get_cash_balance(as_of_date: Union[str, datetime]) -> float:
     Returns:
         float: Net cash balance as of the given date. Returns 0.0 if no transactions exist or an error occurs.
     """
-    # Debug log (comment out in production if needed)
-    print(f"FUNC (get_cash_balance): Calculating cash balance as of '{as_of_date}'")
+    # Debug log (formatted only when DEBUG is enabled)
+    logger.debug("FUNC (get_cash_balance): Calculating cash balance as of '%s'", as_of_date)
 
     try:
         # Convert date to ISO format if it's a datetime object
         if isinstance(as_of_date, datetime):
             as_of_date = as_of_date.isoformat()
 
-        # Query all transactions on or before the specified date
-        transactions = pd.read_sql(
-            "SELECT * FROM transactions WHERE transaction_date <= :as_of_date",
-            db_engine,
-            params={"as_of_date": as_of_date},
-        )
-
-        # Compute the difference between sales and stock purchases
-        if not transactions.empty:
-            total_sales = transactions.loc[transactions["transaction_type"] == "sales", "price"].sum()
-            total_purchases = transactions.loc[transactions["transaction_type"] == "stock_orders", "price"].sum()
-            return float(total_sales - total_purchases)
+        # Compute the difference between sales and stock purchases on or before the specified date
+        balance_query = """
+                        SELECT COALESCE(SUM(CASE
+                                                WHEN transaction_type = 'sales' THEN price
+                                                WHEN transaction_type = 'stock_orders' THEN -price
+                                                ELSE 0
+                            END), 0) AS balance
+                        FROM transactions
+                        WHERE transaction_date <= :as_of_date \
+                        """
+        with db_engine.connect() as conn:
+            row = conn.execute(text(balance_query), {"as_of_date": as_of_date}).fetchone()
 
-        return 0.0
+        return float(row[0])
 
     except Exception as e:
-        print(f"Error getting cash balance: {e}")
+        logger.error("Error getting cash balance: %s", e)
         return 0.0
 
 
+# Current stock level of every inventory item, in catalogue order
+_INVENTORY_VALUATION_QUERY = text("""
+    SELECT i.item_name,
+           i.unit_price,
+           COALESCE(SUM(CASE
+                            WHEN t.transaction_type = 'stock_orders' THEN t.units
+                            WHEN t.transaction_type = 'sales' THEN -t.units
+                            ELSE 0
+               END), 0) AS stock
+    FROM inventory i
+             LEFT JOIN transactions t
+                       ON t.item_name = i.item_name
+                           AND t.transaction_date <= :date
+    GROUP BY i.rowid, i.item_name, i.unit_price
+    ORDER BY i.rowid
+""")
+
+# Top 5 products by sales revenue
+_TOP_SELLING_PRODUCTS_QUERY = text("""
+    SELECT item_name, SUM(units) as total_units, SUM(price) as total_revenue
+    FROM transactions
+    WHERE transaction_type = 'sales'
+      AND transaction_date <= :date
+    GROUP BY item_name
+    ORDER BY total_revenue DESC
+    LIMIT 5
+""")
+
+
 def generate_financial_report(as_of_date: Union[str, datetime]) -> Dict:
     """
     Generate a complete financial report for the company as of a specific date.
@@ -500,37 +673,21 @@ def generate_financial_report(as_of_date: Union[str, datetime]) -> Dict:
     # Get current cash balance
     cash = get_cash_balance(as_of_date)
 
-    # Get current inventory snapshot
-    inventory_df = pd.read_sql("SELECT * FROM inventory", db_engine)
-    inventory_value = 0.0
-    inventory_summary = []
+    # Stock levels and top sellers are aggregated in SQL; the small result sets are read as plain
+    # rows, which avoids building a DataFrame for every report
+    with db_engine.connect() as conn:
+        inventory_rows = conn.execute(_INVENTORY_VALUATION_QUERY, {"date": as_of_date}).all()
+        top_sales_rows = conn.execute(_TOP_SELLING_PRODUCTS_QUERY, {"date": as_of_date}).all()
 
     # Compute total inventory value and summary by item
-    for _, item in inventory_df.iterrows():
-        stock_info = get_stock_level(item["item_name"], as_of_date)
-        stock = stock_info["current_stock"]
-        item_value = stock * item["unit_price"]
-        inventory_value += item_value
-
-        inventory_summary.append({
-            "item_name": item["item_name"],
-            "stock": stock,
-            "unit_price": item["unit_price"],
-            "value": item_value,
-        })
+    inventory_summary = [
+        {"item_name": item_name, "stock": stock, "unit_price": unit_price, "value": stock * unit_price}
+        for item_name, unit_price, stock in inventory_rows
+    ]
+    inventory_value = math.fsum(item["value"] for item in inventory_summary)
 
     # Identify top-selling products by revenue
-    top_sales_query = """
-                      SELECT item_name, SUM(units) as total_units, SUM(price) as total_revenue
-                      FROM transactions
-                      WHERE transaction_type = 'sales'
-                        AND transaction_date <= :date
-                      GROUP BY item_name
-                      ORDER BY total_revenue DESC
-                      LIMIT 5 \
-                      """
-    top_sales = pd.read_sql(top_sales_query, db_engine, params={"date": as_of_date})
-    top_selling_products = top_sales.to_dict(orient="records")
+    top_selling_products = [dict(row._mapping) for row in top_sales_rows]
 
     return {
         "as_of_date": as_of_date,
@@ -542,6 +699,48 @@ def generate_financial_report(as_of_date: Union[str, datetime]) -> Dict:
     }
 
 
+_QUOTE_HISTORY_COLUMNS = """
+        qr.response AS original_request,
+        q.total_amount,
+        q.quote_explanation,
+        q.job_type,
+        q.order_size,
+        q.event_type,
+        q.order_date
+"""
+
+# Full-text search over the 'quote_fts' index, most recent (then most relevant) first
+_SEARCH_QUOTE_HISTORY_QUERY = text(f"""
+    SELECT {_QUOTE_HISTORY_COLUMNS}
+    FROM quote_fts f
+    JOIN quotes q ON f.request_id = q.request_id
+    JOIN quote_requests qr ON q.request_id = qr.id
+    WHERE quote_fts MATCH :match
+    ORDER BY q.order_date DESC, f.rank
+    LIMIT :limit
+""")
+
+# Unfiltered listing used when no search terms are given
+_RECENT_QUOTE_HISTORY_QUERY = text(f"""
+    SELECT {_QUOTE_HISTORY_COLUMNS}
+    FROM quotes q
+    JOIN quote_requests qr ON q.request_id = qr.id
+    ORDER BY q.order_date DESC
+    LIMIT :limit
+""")
+
+
+@lru_cache(maxsize=1024)
+def _query_quote_history(match: str, limit: int) -> tuple:
+    """Run the quote history query; results are memoized until `init_database` reloads the quote tables."""
+    with db_engine.connect() as conn:
+        if match:
+            result = conn.execute(_SEARCH_QUOTE_HISTORY_QUERY, {"match": match, "limit": limit})
+        else:
+            result = conn.execute(_RECENT_QUOTE_HISTORY_QUERY, {"limit": limit})
+        return tuple(dict(row._mapping) for row in result)
+
+
 def search_quote_history(search_terms: List[str], limit: int = 5) -> List[Dict]:
     """
     Retrieve a list of historical quotes that match any of the provided search terms.
@@ -550,6 +749,9 @@ def search_quote_history(search_terms: List[str], limit: int = 5) -> List[Dict]:
     the explanation for the quote (from `quotes`) for each keyword. Results are sorted by
     most recent order date and limited by the `limit` parameter.
 
+    Matching uses the 'quote_fts' full-text index, so terms match case-insensitively at the start
+    of words ("paper" also finds "papers") and multi-word terms match as phrases.
+
     Args:
         search_terms (List[str]): List of terms to match against customer requests and explanations.
         limit (int, optional): Maximum number of quote records to return. Default is 5.
@@ -564,45 +766,14 @@ def search_quote_history(search_terms: List[str], limit: int = 5) -> List[Dict]:
             - event_type
             - order_date
     """
-    conditions = []
-    params = {}
-
-    # Build SQL WHERE clause using LIKE filters for each search term
-    for i, term in enumerate(search_terms):
-        param_name = f"term_{i}"
-        conditions.append(
-            f"(LOWER(qr.response) LIKE :{param_name} OR "
-            f"LOWER(q.quote_explanation) LIKE :{param_name})"
-        )
-        params[param_name] = f"%{term.lower()}%"
-
-    # Combine conditions; fallback to always-true if no terms provided
-    where_clause = " AND ".join(conditions) if conditions else "1=1"
-
-    # Final SQL query to join quotes with quote_requests
-    query = f"""
-        SELECT
-            qr.response AS original_request,
-            q.total_amount,
-            q.quote_explanation,
-            q.job_type,
-            q.order_size,
-            q.event_type,
-            q.order_date
-        FROM quotes q
-        JOIN quote_requests qr ON q.request_id = qr.id
-        WHERE {where_clause}
-        ORDER BY q.order_date DESC
-        LIMIT {limit}
-    """
+    # Quote every term as an FTS5 prefix phrase and accept a match on any of them
+    match = " OR ".join('"{}"*'.format(term.replace('"', '""')) for term in search_terms if term.strip())
 
     try:
-        # Execute parameterized query
-        with db_engine.connect() as conn:
-            result = conn.execute(text(query), params)
-            return [dict(row) for row in result]
+        # Return copies so callers cannot mutate the cached rows
+        return [dict(row) for row in _query_quote_history(match, int(limit))]
     except Exception as e:
-        print(f"Error searching quote history: {e}")
+        logger.error("Error searching quote history: %s", e)
         return []
 
 
@@ -615,8 +786,14 @@ def search_quote_history(search_terms: List[str], limit: int = 5) -> List[Dict]:
 ########################
 
 # Custom imports for your multi-agent system
+import importlib.util
+
+import httpx
 from dotenv import load_dotenv
+from openai import AsyncOpenAI
 from pydantic_ai import Agent
+from pydantic_ai.models.openai import OpenAIModel
+from pydantic_ai.providers.openai import OpenAIProvider
 from pydantic_ai.tools import Tool
 from pydantic_ai.settings import ModelSettings
 from pydantic import BaseModel
@@ -625,6 +802,100 @@ from typing import Dict, Literal
 # Set up and load your env parameters and instantiate your model.
 load_dotenv()
 
+# Default OpenAI request budget; replaced by the account's actual limit once the API reports it
+OPENAI_REQUESTS_PER_MINUTE = 500
+
+
+class AsyncTokenBucket:
+    """
+    Token-bucket rate limiter for coroutines.
+
+    Callers reserve a token and sleep until it is available, so concurrent callers are spaced out
+    evenly without holding a lock.
+    """
+
+    def __init__(self, requests_per_minute: float, burst: int = 10):
+        self.rate = requests_per_minute / 60.0
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self) -> None:
+        """Wait until a request may be sent."""
+        self._refill()
+        self._tokens -= 1
+        if self._tokens < 0:
+            await asyncio.sleep(-self._tokens / self.rate)
+
+    def update_from_headers(self, limit: Union[str, None], remaining: Union[str, None]) -> None:
+        """Adjust the bucket to the `x-ratelimit-*-requests` headers returned by the API."""
+        if limit and limit.isdigit() and int(limit) > 0:
+            self.rate = int(limit) / 60.0
+        if remaining and remaining.isdigit():
+            self._refill()
+            self._tokens = min(self._tokens, float(remaining))
+
+
+openai_rate_limiter = AsyncTokenBucket(OPENAI_REQUESTS_PER_MINUTE)
+
+
+async def _throttle_openai_request(request: httpx.Request) -> None:
+    await openai_rate_limiter.acquire()
+
+
+async def _track_openai_rate_limit(response: httpx.Response) -> None:
+    openai_rate_limiter.update_from_headers(
+        response.headers.get("x-ratelimit-limit-requests"),
+        response.headers.get("x-ratelimit-remaining-requests"),
+    )
+
+
+@lru_cache(maxsize=None)
+def shared_openai_client() -> AsyncOpenAI:
+    """
+    One keep-alive HTTP client shared by every agent, so connections (and TLS sessions) are reused
+    across agents and requests; HTTP/2 multiplexing is used when the optional `h2` package is installed.
+    Transient API errors are retried by the OpenAI client with exponential backoff, and every request
+    passes through the shared rate limiter. Created on first use, so importing the module needs no API key.
+    """
+    return AsyncOpenAI(
+        http_client=httpx.AsyncClient(
+            http2=importlib.util.find_spec("h2") is not None,
+            timeout=httpx.Timeout(120.0, connect=10.0),
+            limits=httpx.Limits(max_connections=200, max_keepalive_connections=100),
+            event_hooks={"request": [_throttle_openai_request], "response": [_track_openai_rate_limit]},
+        ),
+        max_retries=3,
+    )
+
+
+@lru_cache(maxsize=None)
+def openai_model(model_name: str) -> OpenAIModel:
+    """Return the OpenAI chat model for `model_name`, built on first use with the shared HTTP client."""
+    return OpenAIModel(model_name, provider=OpenAIProvider(openai_client=shared_openai_client()))
+
+
+# Structured data handed from one agent to the next is embedded in prompts as compact JSON,
+# using orjson when the optional package is installed
+try:
+    import orjson
+
+    def to_prompt_json(data) -> str:
+        """Serialize data for inclusion in an agent prompt."""
+        return orjson.dumps(data, default=str).decode()
+except ImportError:
+    import json
+
+    def to_prompt_json(data) -> str:
+        """Serialize data for inclusion in an agent prompt."""
+        return json.dumps(data, default=str, ensure_ascii=False, separators=(",", ":"))
+
+
 # Define tools for the agents
 tool_create_transaction = Tool(
     name="create_transaction",
@@ -726,304 +997,557 @@ class OrchestrationClassification(BaseModel):
 
 
 class InventoryResponse(BaseModel):
-    answer: str
     proceed_with_order: bool
+    # True when the answer reports a shortage, a restocking order or a later delivery; set before
+    # `answer` so a streamed response reveals it early
+    details_changed: bool
+    answer: str
+
+
+class InvoiceLineItem(BaseModel):
+    item_name: str
+    quantity: int
+    unit_price: float
+
+
+class SalesResponse(BaseModel):
+    answer: str
+    line_items: List[InvoiceLineItem]
+    discount_amount: float
+    order_date: str
+    delivery_date: str
+
+
+# System prompts are module-level constants with the indentation stripped, so every call sends
+# the same byte-identical prefix and OpenAI's automatic prompt caching can reuse it
+PROMPT_CACHE_KEY_PREFIX = "beaver-v1"
+
+
+def agent_model_settings(agent_key: str, **settings) -> ModelSettings:
+    """Model settings that route an agent's requests to its own prompt cache."""
+    return ModelSettings(extra_body={"prompt_cache_key": f"{PROMPT_CACHE_KEY_PREFIX}-{agent_key}"}, **settings)
+
+
+ORCHESTRATION_SYSTEM_PROMPT = """
+You are the Orchestration Agent for the Munder Difflin paper supply company.
+
+Your sole task is to analyze incoming customer requests and classify them into one of two categories:
+
+- **INQUIRY**: The customer is requesting information only (e.g., about inventory levels, availability, delivery dates, financial performance).
+- **ORDER**: The customer intends to place an order, purchase, or buy a product.
+
+---
+
+## Classification Rules:
+
+1. If the customer asks *whether something is available*, *in stock*, or *can be delivered by a specific date*, this is an **INQUIRY**.
+2. If the customer wants to *purchase*, *order*, or *buy* something — even if no quantities are specified — this is an **ORDER**.
+3. If the customer asks about price comparisons or historical quotes **without** saying they want to buy, it's an **INQUIRY**.
+4. If the customer wants to *finalize* an order or *proceed with* a purchase, this is an **ORDER**.
+5. If unsure, be conservative and classify as **INQUIRY**.
+
+---
+
+## Output Format:
+
+Return a JSON object using the following Pydantic schema:
+
+```python
+class OrchestrationClassification(BaseModel):
+    classification: Literal["INQUIRY", "ORDER"]
+""".strip()
+
+
+INVENTORY_SYSTEM_PROMPT = """
+You are the Inventory Agent for the Munder Difflin paper supply company.
+
+You receive structured requests that are classified as either INQUIRY or ORDER.
+You must follow the correct logic depending on the classification:
+
+---
+
+## IF classification == "INQUIRY":
+- Check current stock levels for the requested item(s).
+- If the customer asks about delivery feasibility, use `get_supplier_delivery_date`.
+- Provide a clear and helpful response.
+- DO NOT trigger any inventory changes.
+- Output should include the available quantity and, if relevant, the estimated delivery date.
+
+---
+
+## IF classification == "ORDER":
+- Check current stock levels for the requested item(s).
+- If there is **enough stock**, respond that the order can be fulfilled immediately.
+- If **stock is insufficient**, perform the following steps:
+    1. Use `create_transaction` to initiate a **restocking order**.
+    2. Use `get_supplier_delivery_date` to estimate **when the item will be available**.
+    3. In your response, clearly inform the next agent that the material **has been reordered**
+---
+
+## Output Expectations:
+- Be clear whether stock is sufficient or not.
+- If a restocking order was triggered, explicitly check the expected delivery date and the answer from get_supplier_delivery_date:
+  1. If the `get_supplier_delivery_date` is after the expected delivery date, response with proceed_with_order = False.
+  2. Explain the situation to a customer and inform them that the order will be not fulfilled immediately.
+- Set details_changed = True if your answer reports insufficient stock, a restocking order or a delivery later than
+  requested; set it to False if all items can be fulfilled from current stock as requested.
+
+---
+
+## Tools Available:
+- `get_all_inventory`: Full snapshot of inventory.
+- `get_stock_level`: Check quantity for specific item.
+- `get_supplier_delivery_date`: Estimate restocking delivery time.
+- `create_transaction`: Place a restocking order (only in ORDER mode).
+
+---
+
+Always follow this decision logic.
+Be accurate and concise.
+
+---
+## Output Format:
+
+Return a JSON object using the following Pydantic schema:
+
+```python
+   class InventoryResponse(BaseModel):
+     proceed_with_order: bool
+     details_changed: bool
+     answer: str
+""".strip()
+
+
+QUOTING_SYSTEM_PROMPT = """
+You are the Quote Agent for the Munder Difflin paper supply company.
+
+Your task is to generate a competitive and strategic sales quote based on:
+- The customer’s order request
+- The current stock and delivery capabilities provided by the Inventory Agent
+- Historical quote and sales data
+
+---
+
+## Step-by-Step Responsibilities:
+
+1. **Analyze the customer's request**:
+   - Identify the requested item(s), quantity, and delivery expectations.
+
+2. **Use inventory context**:
+   - Determine whether the items are available or when they will be deliverable (this information is provided to you as input).
+   - You do not check inventory yourself — this has already been handled.
+
+3. **Analyze pricing history**:
+   - Use `search_quote_history` to find comparable past quotes.
+   - Use `generate_financial_report` if needed to detect patterns in profitable sales or pricing trends.
+
+4. **Calculate a competitive quote**:
+   - Apply volume discounts if appropriate.
+   - Factor in urgency, customer history (if available), and market alignment.
+   - Ensure profitability while being attractive to the customer.
+
+5. **Prepare the output**:
+   - Provide a clear price per unit and total price.
+   - Include any relevant remarks (e.g., “discount applied due to high volume”).
+
+---
+
+## Tools Available:
+- `search_quote_history`: Retrieve previous similar offers for reference.
+- `generate_financial_report`: Analyze broader pricing and sales trends for optimization.
+
+---
+
+You are not responsible for checking stock or creating transactions. Focus solely on generating an optimized offer based on the current situation and business goals.
+""".strip()
+
+
+SALES_SYSTEM_PROMPT = """
+You are the Sales Finalization Agent for the Munder Difflin paper supply company.
+
+Your job is to complete the customer's order based on the quote provided by the Quote Agent and current inventory status.
+
+---
+
+## Responsibilities:
+
+1. **Assume the customer wants to proceed with the quoted order**. No confirmation is needed.
+
+2. **Estimate the delivery date** based on:
+   - Order size
+   - Current date
+   - Use `get_supplier_delivery_date` if needed.
+
+3. **Record the sale**:
+   - Use `create_transaction` to store the order in the system.
+   - Include: item name(s), quantity, price per unit, total price, and date.
+
+4. **Respond to the customer**:
+   - Confirm that the order was successful.
+   - Provide the estimated delivery date.
+   - Thank the customer for their business.
+
+---
+
+## Tools Available:
+- `get_supplier_delivery_date`: Estimate delivery date
+- `create_transaction`: Finalize and save the sale
+
+---
+
+## Important Notes:
+- Do not generate a new quote or price – that has already been handled.
+- Your role is strictly to verify feasibility and execute the transaction.
+- Maintain a polite and professional tone.
+
+---
+
+## Output Format:
+
+Return a JSON object using the following Pydantic schema:
+- `answer`: your response to the customer (step 4)
+- `line_items`: every sold item with its quantity and quoted price per unit
+- `discount_amount`: total discount granted by the quote (0 if none)
+- `order_date` / `delivery_date`: ISO dates (YYYY-MM-DD)
+
+```python
+class InvoiceLineItem(BaseModel):
+    item_name: str
+    quantity: int
+    unit_price: float
+
+class SalesResponse(BaseModel):
+    answer: str
+    line_items: List[InvoiceLineItem]
+    discount_amount: float
+    order_date: str
+    delivery_date: str
+""".strip()
+
+
+INVOICE_SYSTEM_PROMPT = """
+You are the Invoice Agent for the Munder Difflin paper supply company.
+
+Your job is to generate a complete and professional **customer invoice** based on the finalized order.
+You receive structured input data including:
+- customer name and optional contact information
+- item(s), quantities, unit prices, and total price
+- information about any discounts applied
+- delivery date (if known)
+
+---
+
+## Your response must consist of two parts:
+
+### 1. Friendly Response Text
+- Briefly thank the customer for their order.
+- Confirm what was ordered and when it will be delivered.
+- Mention that an invoice is attached below.
+
+### 2. Formatted Invoice (as plain text)
+Generate a well-formatted `.txt` invoice block using ASCII layout.
+- Always include:
+  - Invoice number (generate a realistic placeholder like `INV-2025-XXX`)
+  - Date of issue (use current date)
+  - Customer name, address and email — use `<placeholder>` if missing
+  - List of items (name, quantity, unit price, line total)
+  - Total amount (net)
+  - Discount shown explicitly if applicable
+  - Grand total (after discount)
+  - Delivery date
+  - Thank-you note at the bottom
+
+---
+
+## Formatting Notes:
+- Use a monospaced layout for the invoice block.
+- Align columns using spaces (not tabs).
+- Keep the width readable (max ~80 characters).
+- Separate sections with dashed lines or whitespace.
+
+---
+
+## Example of the invoice format (shortened):
+Invoice No: INV-2025-034
+Date: 2025-07-21
+
+Bill To:
+Name: John Doe
+Address: <placeholder>
+Email: john@example.com
+
+Items:
+Qty Description Unit Price Line Total
+
+500 A4 Paper (80g/m²) €0.10 €50.00
+
+Subtotal: €50.00
+Discount (10%): -€5.00
+Total Amount Due: €45.00
+
+Expected Delivery Date: 2025-07-25
+
+Thank you for your business!
+
+---
+
+You must:
+- Always generate a full invoice
+- Explicitly list any discounts if applied
+- Use <placeholder> for any missing customer info
+- Respond in a clear, professional tone
+""".strip()
 
 
 # Define orchestration agent
-orchestration_agent = Agent(model="openai:gpt-4o",
-                            name="Orchestration Agent",
-                            model_settings=ModelSettings(temperature=0.0),
-                            system_prompt="""
-                                You are the Orchestration Agent for the Munder Difflin paper supply company.
-                                
-                                Your sole task is to analyze incoming customer requests and classify them into one of two categories:
-                                
-                                - **INQUIRY**: The customer is requesting information only (e.g., about inventory levels, availability, delivery dates, financial performance).
-                                - **ORDER**: The customer intends to place an order, purchase, or buy a product.
-                                
-                                ---
-                                
-                                ## Classification Rules:
-                                
-                                1. If the customer asks *whether something is available*, *in stock*, or *can be delivered by a specific date*, this is an **INQUIRY**.
-                                2. If the customer wants to *purchase*, *order*, or *buy* something — even if no quantities are specified — this is an **ORDER**.
-                                3. If the customer asks about price comparisons or historical quotes **without** saying they want to buy, it's an **INQUIRY**.
-                                4. If the customer wants to *finalize* an order or *proceed with* a purchase, this is an **ORDER**.
-                                5. If unsure, be conservative and classify as **INQUIRY**.
-                                
-                                ---
-                                
-                                ## Output Format:
-                                
-                                Return a JSON object using the following Pydantic schema:
-                                
-                                ```python
-                                class OrchestrationClassification(BaseModel):
-                                    classification: Literal["INQUIRY", "ORDER"]
-                            """,
-                            output_type=OrchestrationClassification
-                            )
+@lru_cache(maxsize=None)
+def _build_orchestration_agent() -> Agent:
+    """Create the Orchestration Agent on first use."""
+    return Agent(
+        model=openai_model("gpt-4o"),
+        name="Orchestration Agent",
+        model_settings=agent_model_settings("orchestration", temperature=0.0),
+        system_prompt=ORCHESTRATION_SYSTEM_PROMPT,
+        output_type=OrchestrationClassification,
+    )
+
 
 # Define inventory agent
 ## Manages the current stock level. Retrieves stock data, checks stock limits and triggers automatic reorders if required (e.g. via create_transaction for reorders).
-inventor_agent = Agent(model="openai:gpt-3.5-turbo",
-                       name="Inventor Agent",
-                       model_settings=ModelSettings(temperature=0.1),
-                       system_prompt="""
-                        You are the Inventory Agent for the Munder Difflin paper supply company.
-                        
-                        You receive structured requests that are classified as either INQUIRY or ORDER.
-                        You must follow the correct logic depending on the classification:
-                        
-                        ---
-                        
-                        ## IF classification == "INQUIRY":
-                        - Check current stock levels for the requested item(s).
-                        - If the customer asks about delivery feasibility, use `get_supplier_delivery_date`.
-                        - Provide a clear and helpful response.
-                        - DO NOT trigger any inventory changes.
-                        - Output should include the available quantity and, if relevant, the estimated delivery date.
-                        
-                        ---
-                        
-                        ## IF classification == "ORDER":
-                        - Check current stock levels for the requested item(s).
-                        - If there is **enough stock**, respond that the order can be fulfilled immediately.
-                        - If **stock is insufficient**, perform the following steps:
-                            1. Use `create_transaction` to initiate a **restocking order**.
-                            2. Use `get_supplier_delivery_date` to estimate **when the item will be available**.
-                            3. In your response, clearly inform the next agent that the material **has been reordered**                            
-                        ---
-                        
-                        ## Output Expectations:
-                        - Be clear whether stock is sufficient or not.
-                        - If a restocking order was triggered, explicitly check the expected delivery date and the answer from get_supplier_delivery_date:
-                          1. If the `get_supplier_delivery_date` is after the expected delivery date, response with proceed_with_order = False.
-                          2. Explain the situation to a customer and inform them that the order will be not fulfilled immediately.
-                        
-                        ---
-                        
-                        ## Tools Available:
-                        - `get_all_inventory`: Full snapshot of inventory.
-                        - `get_stock_level`: Check quantity for specific item.
-                        - `get_supplier_delivery_date`: Estimate restocking delivery time.
-                        - `create_transaction`: Place a restocking order (only in ORDER mode).
-                        
-                        ---
-                        
-                        Always follow this decision logic.
-                        Be accurate and concise.
-                        
-                        --- 
-                        ## Output Format:
-                                
-                        Return a JSON object using the following Pydantic schema:
-                                
-                        ```python
-                           class InventoryResponse(BaseModel):
-                             answer: str
-                             proceed_with_order: bool
-                        
-                        """,
-                       tools=toolset_inventor_agent,
-                       output_type=InventoryResponse
-                       )
+@lru_cache(maxsize=None)
+def _build_inventory_agent() -> Agent:
+    """Create the Inventor Agent on first use."""
+    return Agent(
+        model=openai_model("gpt-3.5-turbo"),
+        name="Inventor Agent",
+        model_settings=agent_model_settings("inventory", temperature=0.1),
+        system_prompt=INVENTORY_SYSTEM_PROMPT,
+        tools=toolset_inventor_agent,
+        output_type=InventoryResponse,
+    )
+
 
 # Define quoting agent
 ## Analyzes past offers and prices in order to create a suitable offer for a customer request based on strategic specifications.
 ## Takes into account, for example, volume discounts or key financial figures.
-quoting_agent = Agent(model="openai:gpt-4o",
-                      name="Quoting Agent",
-                      model_settings=ModelSettings(temperature=0.3),
-                      system_prompt="""
-                        You are the Quote Agent for the Munder Difflin paper supply company.
-                        
-                        Your task is to generate a competitive and strategic sales quote based on:
-                        - The customer’s order request
-                        - The current stock and delivery capabilities provided by the Inventory Agent
-                        - Historical quote and sales data
-                        
-                        ---
-                        
-                        ## Step-by-Step Responsibilities:
-                        
-                        1. **Analyze the customer's request**:
-                           - Identify the requested item(s), quantity, and delivery expectations.
-                        
-                        2. **Use inventory context**:
-                           - Determine whether the items are available or when they will be deliverable (this information is provided to you as input).
-                           - You do not check inventory yourself — this has already been handled.
-                        
-                        3. **Analyze pricing history**:
-                           - Use `search_quote_history` to find comparable past quotes.
-                           - Use `generate_financial_report` if needed to detect patterns in profitable sales or pricing trends.
-                        
-                        4. **Calculate a competitive quote**:
-                           - Apply volume discounts if appropriate.
-                           - Factor in urgency, customer history (if available), and market alignment.
-                           - Ensure profitability while being attractive to the customer.
-                        
-                        5. **Prepare the output**:
-                           - Provide a clear price per unit and total price.
-                           - Include any relevant remarks (e.g., “discount applied due to high volume”).
-                        
-                        ---
-                        
-                        ## Tools Available:
-                        - `search_quote_history`: Retrieve previous similar offers for reference.
-                        - `generate_financial_report`: Analyze broader pricing and sales trends for optimization.
-                        
-                        ---
-                        
-                        You are not responsible for checking stock or creating transactions. Focus solely on generating an optimized offer based on the current situation and business goals.
-                      """,
-                      tools=toolset_quoting_agent
-                      )
+@lru_cache(maxsize=None)
+def _build_quoting_agent() -> Agent:
+    """Create the Quoting Agent on first use."""
+    return Agent(
+        model=openai_model("gpt-4o"),
+        name="Quoting Agent",
+        model_settings=agent_model_settings("quoting", temperature=0.3),
+        system_prompt=QUOTING_SYSTEM_PROMPT,
+        tools=toolset_quoting_agent,
+    )
+
 
 # Define ordering agent
 ## Takes over the last step: checks whether the ordered items are available and whether the delivery times are suitable,
 ## and then creates a sales transaction. This completes the order with binding effect.
-sales_finalization_agent = Agent(model="openai:gpt-3.5-turbo",
-                                 name="Sales Finalization Agent",
-                                 model_settings=ModelSettings(temperature=0.2),
-                                 system_prompt="""
-                                    You are the Sales Finalization Agent for the Munder Difflin paper supply company.
-                                    
-                                    Your job is to complete the customer's order based on the quote provided by the Quote Agent and current inventory status.
-                                    
-                                    ---
-                                    
-                                    ## Responsibilities:
-                                    
-                                    1. **Assume the customer wants to proceed with the quoted order**. No confirmation is needed.
-                                  
-                                    2. **Estimate the delivery date** based on:
-                                       - Order size
-                                       - Current date
-                                       - Use `get_supplier_delivery_date` if needed.
-                                    
-                                    3. **Record the sale**:
-                                       - Use `create_transaction` to store the order in the system.
-                                       - Include: item name(s), quantity, price per unit, total price, and date.
-                                    
-                                    4. **Respond to the customer**:
-                                       - Confirm that the order was successful.
-                                       - Provide the estimated delivery date.
-                                       - Thank the customer for their business.
-                                    
-                                    ---
-                                    
-                                    ## Tools Available:
-                                    - `get_supplier_delivery_date`: Estimate delivery date
-                                    - `create_transaction`: Finalize and save the sale
-                                    
-                                    ---
-                                    
-                                    ## Important Notes:
-                                    - Do not generate a new quote or price – that has already been handled.
-                                    - Your role is strictly to verify feasibility and execute the transaction.
-                                    - Maintain a polite and professional tone.
-                                    
-                                    """,
-                                 tools=toolset_sales_finalization_agent
-                                 )
+@lru_cache(maxsize=None)
+def _build_sales_agent() -> Agent:
+    """Create the Sales Finalization Agent on first use."""
+    return Agent(
+        model=openai_model("gpt-3.5-turbo"),
+        name="Sales Finalization Agent",
+        model_settings=agent_model_settings("sales", temperature=0.2),
+        system_prompt=SALES_SYSTEM_PROMPT,
+        tools=toolset_sales_finalization_agent,
+        output_type=SalesResponse,
+    )
+
 
 # Define invoice agent
 ## This agent generate a complete and professional **customer invoice** based on the finalized order
-invoice_agent = Agent(model="openai:gpt-4o",
-                      name="Invoice Agent",
-                      model_settings=ModelSettings(
-                          temperature=0.3),
-                      system_prompt="""    
-                            You are the Invoice Agent for the Munder Difflin paper supply company.
-                            
-                            Your job is to generate a complete and professional **customer invoice** based on the finalized order.
-                            You receive structured input data including:
-                            - customer name and optional contact information
-                            - item(s), quantities, unit prices, and total price
-                            - information about any discounts applied
-                            - delivery date (if known)
-                            
-                            ---
-                            
-                            ## Your response must consist of two parts:
-                            
-                            ### 1. Friendly Response Text
-                            - Briefly thank the customer for their order.
-                            - Confirm what was ordered and when it will be delivered.
-                            - Mention that an invoice is attached below.
-                            
-                            ### 2. Formatted Invoice (as plain text)
-                            Generate a well-formatted `.txt` invoice block using ASCII layout.
-                            - Always include:
-                              - Invoice number (generate a realistic placeholder like `INV-2025-XXX`)
-                              - Date of issue (use current date)
-                              - Customer name, address and email — use `<placeholder>` if missing
-                              - List of items (name, quantity, unit price, line total)
-                              - Total amount (net)
-                              - Discount shown explicitly if applicable
-                              - Grand total (after discount)
-                              - Delivery date
-                              - Thank-you note at the bottom
-                            
-                            ---
-                            
-                            ## Formatting Notes:
-                            - Use a monospaced layout for the invoice block.
-                            - Align columns using spaces (not tabs).
-                            - Keep the width readable (max ~80 characters).
-                            - Separate sections with dashed lines or whitespace.
-                            
-                            ---
-                            
-                            ## Example of the invoice format (shortened):
-                            Invoice No: INV-2025-034
-                            Date: 2025-07-21
-                            
-                            Bill To:
-                            Name: John Doe
-                            Address: <placeholder>
-                            Email: john@example.com
-                            
-                            Items:
-                            Qty Description Unit Price Line Total
-                            
-                            500 A4 Paper (80g/m²) €0.10 €50.00
-                            
-                            Subtotal: €50.00
-                            Discount (10%): -€5.00
-                            Total Amount Due: €45.00
-                            
-                            Expected Delivery Date: 2025-07-25
-                            
-                            Thank you for your business!
-                            
-                            ---
-                            
-                            You must:
-                            - Always generate a full invoice
-                            - Explicitly list any discounts if applied
-                            - Use <placeholder> for any missing customer info
-                            - Respond in a clear, professional tone
-                        """
-                      )
+@lru_cache(maxsize=None)
+def _build_invoice_agent() -> Agent:
+    """Create the Invoice Agent on first use."""
+    return Agent(
+        model=openai_model("gpt-4o-mini"),
+        name="Invoice Agent",
+        model_settings=agent_model_settings("invoice", temperature=0.3),
+        system_prompt=INVOICE_SYSTEM_PROMPT,
+    )
+
+
+# Plain-text invoice layout rendered locally from the structured sales result
+INVOICE_TEMPLATE = """\
+{answer}
+
+Please find your invoice below.
+
+--------------------------------------------------------------------------------
+Invoice No: {invoice_no}
+Date: {issue_date}
+
+Bill To:
+Name: <placeholder>
+Address: <placeholder>
+Email: <placeholder>
+
+Items:
+{item_lines}
+
+Subtotal: {subtotal}
+{discount_line}Total Amount Due: {total}
+
+Expected Delivery Date: {delivery_date}
+
+Thank you for your business!
+--------------------------------------------------------------------------------"""
+
+_INVOICE_NUMBERS = itertools.count(1)
+
+# Invoice amounts are shown in euros, as in the invoice agent's example format
+INVOICE_CURRENCY = "€"
+
+
+def render_invoice(sales: SalesResponse) -> str:
+    """
+    Render the customer response and ASCII invoice for a finalized order without an LLM call.
+
+    Raises:
+        ValueError: If the sales result has no line items or an invalid order date.
+    """
+    if not sales.line_items:
+        raise ValueError("Sales result contains no line items")
+    issue_date = datetime.fromisoformat(sales.order_date.partition("T")[0]).strftime("%Y-%m-%d")
+
+    item_lines = [f"{'Qty':>7}  {'Description':<44}{'Unit Price':>12}{'Line Total':>13}"]
+    subtotal = 0.0
+    for item in sales.line_items:
+        line_total = item.quantity * item.unit_price
+        subtotal += line_total
+        item_lines.append(
+            f"{item.quantity:>7}  {item.item_name[:42]:<44}"
+            f"{f'{INVOICE_CURRENCY}{item.unit_price:,.2f}':>12}{f'{INVOICE_CURRENCY}{line_total:,.2f}':>13}"
+        )
+
+    discount = max(sales.discount_amount, 0.0)
+    return INVOICE_TEMPLATE.format(
+        answer=sales.answer,
+        invoice_no=f"INV-{issue_date[:4]}-{next(_INVOICE_NUMBERS):03d}",
+        issue_date=issue_date,
+        item_lines="\n".join(item_lines),
+        subtotal=f"{INVOICE_CURRENCY}{subtotal:,.2f}",
+        discount_line=f"Discount: -{INVOICE_CURRENCY}{discount:,.2f}\n" if discount else "",
+        total=f"{INVOICE_CURRENCY}{subtotal - discount:,.2f}",
+        delivery_date=sales.delivery_date,
+    )
+
+
+# Quoting models: simple requests are priced by the smaller model, complex ones by the full model
+QUOTING_FAST_MODEL = "gpt-4o-mini"
+QUOTING_SLOW_MODEL = "gpt-4o"
+
+_COMPLEX_REQUEST_KEYWORDS = ("urgent", "custom", "negotiate")
+_REQUEST_LINE_ITEM_RE = re.compile(r"^\s*[-*•]", re.MULTILINE)
+_REQUEST_QUANTITY_RE = re.compile(r"\b(\d[\d,]*)\s+(?:[a-z]+\s+)?(?:sheets|reams|units|rolls|packs|boxes|pieces)\b", re.I)
+
+
+def complexity_router(customer_request: str, max_items: int = 3, max_quantity: int = 1000) -> str:
+    """
+    Pick the quoting model name for a request based on a cheap complexity score.
+
+    A request is simple when it lists at most `max_items` line items, asks for at most
+    `max_quantity` units in total and mentions none of the negotiation/custom-work keywords.
+    """
+    quantities = [int(q.replace(",", "")) for q in _REQUEST_QUANTITY_RE.findall(customer_request)]
+    num_items = max(len(_REQUEST_LINE_ITEM_RE.findall(customer_request)), len(quantities), 1)
+    total_quantity = sum(quantities)
+    request_text = customer_request.lower()
+    has_keywords = any(keyword in request_text for keyword in _COMPLEX_REQUEST_KEYWORDS)
+
+    if num_items <= max_items and total_quantity <= max_quantity and not has_keywords:
+        return QUOTING_FAST_MODEL
+    return QUOTING_SLOW_MODEL
+
+
+# Unambiguous phrasings from the orchestration rules; anything else is classified by the LLM.
+# Purchase intent must be stated in the first person (rule 2), and an inquiry needs an actual
+# question, because most orders also mention availability or a delivery deadline.
+_ORDER_INTENT_RE = re.compile(
+    r"\b(?:i|we)(?:'d|'m| would| am| are)? (?:like|love|want|wish|need|plan|ready) to "
+    r"(?:order|buy|purchase|finalize|proceed with|place (?:an?|my|our)(?: \w+)? order)\b",
+    re.IGNORECASE,
+)
+_INQUIRY_QUESTION_RE = re.compile(
+    r"\b(?:do you have|is there|are there|how many|when will|in stock|availab(?:le|ility))\b[^.!?]*\?",
+    re.IGNORECASE,
+)
+
+
+def classify_by_keywords(customer_request: str) -> Union[str, None]:
+    """
+    Classify a request without an LLM call when its wording is unambiguous.
+
+    Args:
+        customer_request (str): The customer's request text.
+
+    Returns:
+        Union[str, None]: "ORDER" or "INQUIRY", or None if the LLM should decide.
+    """
+    is_order = _ORDER_INTENT_RE.search(customer_request) is not None
+    is_inquiry = _INQUIRY_QUESTION_RE.search(customer_request) is not None
+    if is_order == is_inquiry:
+        # Neither or both: e.g. "We'd like to buy A4 paper, is it in stock?" needs the full rules
+        return None
+    return "ORDER" if is_order else "INQUIRY"
+
+
+# Process-wide sequence appended to request ids
+_REQUEST_COUNTER = itertools.count()
+
 
+def new_request_id() -> str:
+    """Create a unique request id; the counter keeps ids unique for requests started in the same instant."""
+    return f"REQ_{time.time_ns()}_{next(_REQUEST_COUNTER)}"
 
-class WorkflowContext(BaseModel):
+
+def normalize_request_text(customer_request: str) -> str:
+    """Reduce a request to its lower-case words, so that trivially different copies compare equal."""
+    return " ".join(re.findall(r"\w+", customer_request.casefold()))
+
+
+@dataclass(slots=True, frozen=True)
+class WorkflowContext:
     """Shared context between agents"""
     request_id: str
     original_request: str
+    # Stream the inventory answer and start quoting before it is complete
+    streaming: bool = False
+
+
+def streaming_enabled() -> bool:
+    """
+    Whether order quotes should start while the inventory answer is still streaming.
+    Enabled by setting the STREAM_ORDER_QUOTES environment variable to "1" or "true".
+    """
+    return os.getenv("STREAM_ORDER_QUOTES", "").strip().lower() in ("1", "true")
+
+
+# Inventory context given to a quote started before the inventory agent has finished
+SPECULATIVE_INVENTORY_CONTEXT = "The Inventory Agent has confirmed that the order can proceed; full details are pending."
+
+# Prompt sections passed between the workflow steps, one per line
+CLASSIFICATION_SECTION = "Classification: {}".format
+USER_REQUEST_SECTION = "User Request: {}".format
+INVENTORY_CONTEXT_SECTION = "Inventory Context: {}".format
+QUOTE_HISTORY_SECTION = "Similar Past Quotes: {}".format
+QUOTE_CONTEXT_SECTION = "Quote Context: {}".format
+SALES_CONTEXT_SECTION = "Sales Context: {}".format
 
 
 class MultiAgentWorkflow:
     def __init__(self):
+        # Agent factories by role; each agent is built on first use and shared afterwards
         self.agents = {
-            "orchestration": orchestration_agent,
-            "inventory": inventor_agent,
-            "quoting": quoting_agent,
-            "sales": sales_finalization_agent,
-            "invoice": invoice_agent
+            "orchestration": _build_orchestration_agent,
+            "inventory": _build_inventory_agent,
+            "quoting": _build_quoting_agent,
+            "sales": _build_sales_agent,
+            "invoice": _build_invoice_agent
         }
 
         self.agent_usage_count = {
@@ -1033,106 +1557,224 @@ class MultiAgentWorkflow:
             "invoice": 0,
         }
 
-    def handle_inquiry(self, context: WorkflowContext) -> str:
+        # Orchestration results keyed by a hash of the normalized request text
+        self.classification_cache: Dict[str, str] = {}
+
+    @staticmethod
+    async def _prefetch_quote_history(customer_request: str) -> List[Dict]:
+        """
+        Look up past quotes for the catalogue items mentioned in the request (off the event loop).
+        """
+        request_text = customer_request.lower()
+        search_terms = [name for name in PAPER_BY_NAME if name.lower() in request_text]
+        if not search_terms:
+            return []
+        return await asyncio.to_thread(search_quote_history, search_terms)
+
+    async def classify(self, context: WorkflowContext) -> str:
+        """
+        Classify the request as INQUIRY or ORDER, reusing the result for repeated requests.
+        Requests with unambiguous wording are classified locally without calling the orchestration agent.
+        """
+        classification = classify_by_keywords(context.original_request)
+        if classification is not None:
+            return classification
+
+        cache_key = hashlib.blake2b(normalize_request_text(context.original_request).encode(), digest_size=16).hexdigest()
+        classification = self.classification_cache.get(cache_key)
+        if classification is None:
+            orchestration_response = await self.agents["orchestration"]().run(
+                context.original_request,
+                deps=context
+            )
+            classification = orchestration_response.output.classification
+            self.classification_cache[cache_key] = classification
+        return classification
+
+    async def handle_inquiry(self, context: WorkflowContext) -> str:
         """
         Handle customer inquiries by using the quoting agent to generate a financial report
         and the evaluation agent to assess the response.
         """
         # Call quoting agent to generate financial report
-        prompt = f"""
-        Classification: INQUIRY
-
-        User Request: {context.original_request}
-        """
-        inventory_response = self.agents["inventory"].run_sync(
+        prompt = "\n".join([CLASSIFICATION_SECTION("INQUIRY"), USER_REQUEST_SECTION(context.original_request)])
+        inventory_response = await self.agents["inventory"]().run(
             prompt,
             deps=context
         )
         self.agent_usage_count["inventory"] += 1
-        return inventory_response.output
+        return inventory_response.output.answer
 
-    def handle_order(self, context: WorkflowContext) -> str:
-        inventory_prompt = f"""
-            Classification: ORDER
-    
-            User Request: {context.original_request}
+    async def _run_quoting(self, context: WorkflowContext, order_context: List[str], quote_history: List[Dict]):
+        """
+        Call the quoting agent for the order, using the model picked by `complexity_router`.
+        `order_context` holds the prompt sections produced by the previous steps.
         """
-        # Call inventory agent to check stock levels and handle order for stock items
-        inventory_response = self.agents["inventory"].run_sync(
-            inventory_prompt,
+        quoting_response = await self.agents["quoting"]().run(
+            "\n".join([*order_context, QUOTE_HISTORY_SECTION(to_prompt_json(quote_history))]),
+            model=openai_model(complexity_router(context.original_request)),
             deps=context
         )
-        self.agent_usage_count["inventory"] += 1
+        self.agent_usage_count["quoting"] += 1
+        return quoting_response
 
-        if not inventory_response.output.proceed_with_order:
-            # If inventory agent indicates order cannot proceed, return a message
-            print(f"Order cannot be processed: {inventory_response.output.answer}")
-            return inventory_response.output.answer
+    async def _stream_inventory(self, context: WorkflowContext, order_context: List[str], quote_history_task):
+        """
+        Stream the inventory agent's answer and start quoting as soon as it reports that the order
+        can proceed as requested, instead of waiting for the complete inventory answer.
 
-        # Call quoting agent to generate a quote based on the order
-        quote_prompt = f"""
-            User Request: {context.original_request}
-            Inventory Context: {inventory_response.output.answer}
+        Returns the final inventory output and the speculative quoting task (or None if none was started).
         """
-        quoting_response = self.agents["quoting"].run_sync(
-            quote_prompt,
-            deps=context
-        )
-        self.agent_usage_count["quoting"] += 1
+        speculative_quote = None
+
+        async def quote_while_inventory_finishes():
+            speculative_context = [*order_context, INVENTORY_CONTEXT_SECTION(SPECULATIVE_INVENTORY_CONTEXT)]
+            # Shielded: cancelling the speculative quote must not cancel the lookup the real quote reuses
+            return await self._run_quoting(context, speculative_context, await asyncio.shield(quote_history_task))
+
+        inventory_prompt = "\n".join([CLASSIFICATION_SECTION("ORDER"), *order_context])
+        try:
+            async with self.agents["inventory"]().run_stream(inventory_prompt, deps=context) as result:
+                async for partial_output in result.stream():
+                    # Shortages or restocking change what the quote should say, so those orders
+                    # wait for the full answer
+                    if (speculative_quote is None and partial_output.proceed_with_order
+                            and not partial_output.details_changed):
+                        speculative_quote = asyncio.create_task(quote_while_inventory_finishes())
+                inventory_output = await result.get_output()
+        except BaseException:
+            # Don't leave the speculative quote running if the inventory step failed
+            if speculative_quote is not None:
+                speculative_quote.cancel()
+            raise
+
+        return inventory_output, speculative_quote
+
+    async def handle_order(self, context: WorkflowContext) -> str:
+        # Prompt sections shared by the order steps; each step appends its result, so later prompts
+        # extend the earlier ones instead of re-interpolating every piece of context
+        order_context = [USER_REQUEST_SECTION(context.original_request)]
+
+        # Call inventory agent to check stock levels and handle order for stock items,
+        # while looking up past quotes for the requested catalogue items in parallel
+        quote_history_task = asyncio.create_task(self._prefetch_quote_history(context.original_request))
+        speculative_quote = None
+        try:
+            if context.streaming:
+                inventory_output, speculative_quote = await self._stream_inventory(
+                    context, order_context, quote_history_task
+                )
+            else:
+                inventory_response = await self.agents["inventory"]().run(
+                    "\n".join([CLASSIFICATION_SECTION("ORDER"), *order_context]),
+                    deps=context
+                )
+                inventory_output = inventory_response.output
+            self.agent_usage_count["inventory"] += 1
+
+            if not inventory_output.proceed_with_order:
+                # If inventory agent indicates order cannot proceed, return a message
+                logger.info("Order cannot be processed: %s", inventory_output.answer)
+                return inventory_output.answer
+            order_context.append(INVENTORY_CONTEXT_SECTION(inventory_output.answer))
+
+            # Call quoting agent to generate a quote based on the order (or use the one started while streaming)
+            if speculative_quote is not None and not inventory_output.details_changed:
+                logger.info("Using the quote started while the inventory answer was streaming")
+                quoting_response = await speculative_quote
+            else:
+                quoting_response = await self._run_quoting(context, order_context, await quote_history_task)
+        finally:
+            # No-ops once the tasks are done; otherwise don't leave them running after an early return or error
+            quote_history_task.cancel()
+            if speculative_quote is not None:
+                speculative_quote.cancel()
+        order_context.append(QUOTE_CONTEXT_SECTION(quoting_response.output))
 
         # Call sales finalization agent to finalize the order
-        sales_prompt = f"""
-            User Request: {context.original_request}
-            Inventory Context: {inventory_response.output.answer}
-            Quote Context: {quoting_response.output}
-        """
-        sales_response = self.agents["sales"].run_sync(
-            sales_prompt,
+        sales_response = await self.agents["sales"]().run(
+            "\n".join(order_context),
             deps=context
         )
         self.agent_usage_count["sales"] += 1
 
+        # Render the invoice locally; fall back to the invoice agent if the sales result cannot be rendered
+        try:
+            return render_invoice(sales_response.output)
+        except (ValueError, TypeError) as e:
+            logger.warning("Invoice template failed (%s), falling back to invoice agent", e)
+
         # Call invoice agent to generate an invoice for the order
-        invoice_prompt = f"""
-            User Request: {context.original_request}
-            Inventory Context: {inventory_response.output.answer}
-            Quote Context: {quoting_response.output}
-            Sales Context: {sales_response.output}
-        """
-        invoice_response = invoice_agent.run_sync(
-            invoice_prompt,
+        order_context.append(SALES_CONTEXT_SECTION(sales_response.output.model_dump_json()))
+        self.agent_usage_count["invoice"] += 1
+        invoice_response = await self.agents["invoice"]().run(
+            "\n".join(order_context),
             deps=context
         )
-        self.agent_usage_count["invoice"] += 1
 
-        # Return the final response from the sales agent
+        # Return the final response from the invoice agent
         return invoice_response.output
 
-    def run(self, customer_request: str) -> str:
+    async def classify_many(
+            self, customer_requests: List[str], semaphore: Union[asyncio.Semaphore, None] = None
+    ) -> Dict[str, str]:
+        """
+        Classify a batch of requests, classifying each distinct request only once.
+        Requests that differ only in case, whitespace or punctuation share a classification.
+        At most MAX_CONCURRENT_REQUESTS classifications run at once, or as many as `semaphore` allows.
+
+        Returns a mapping from each request to its classification.
+        """
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+
+        async def classify_one(customer_request: str) -> str:
+            async with semaphore:
+                return await self.classify(
+                    WorkflowContext(request_id=new_request_id(), original_request=customer_request)
+                )
+
+        representatives: Dict[str, str] = {}
+        for customer_request in customer_requests:
+            representatives.setdefault(normalize_request_text(customer_request), customer_request)
+
+        classifications = await asyncio.gather(
+            *(classify_one(customer_request) for customer_request in representatives.values())
+        )
+        by_key = dict(zip(representatives, classifications))
+        return {
+            customer_request: by_key[normalize_request_text(customer_request)]
+            for customer_request in customer_requests
+        }
+
+    async def run(
+            self, customer_request: str, streaming: bool = False, classification: Union[str, None] = None
+    ) -> str:
         """
         Run the multi-agent workflow for a given customer request.
         This method orchestrates the agents to handle the request and return a response.
+        With `streaming`, order quotes are started while the inventory answer is still being generated.
+        A `classification` from `classify_many` skips the orchestration step.
         """
         # Create workflow context
         context = WorkflowContext(
-            request_id=f"REQ_{datetime.now().strftime('%Y%m%d%H%M%S')}",
-            original_request=customer_request
+            request_id=new_request_id(),
+            original_request=customer_request,
+            streaming=streaming
         )
 
         # Step 1: Call the orchestration agent to classify the request
-        orchestration_response = self.agents["orchestration"].run_sync(
-            customer_request,
-            deps=context
-        )
-        print(f"--- Orchestration Agent classified request as: {orchestration_response.output.classification}")
+        if classification is None:
+            classification = await self.classify(context)
+        logger.info("--- Orchestration Agent classified request as: %s", classification)
 
         # Step 2: Based on classification, route to appropriate agents
-        if orchestration_response.output.classification == "INQUIRY":
+        if classification == "INQUIRY":
             # Handle inquiries with quoting and evaluation agents
-            response = self.handle_inquiry(context)
-        elif orchestration_response.output.classification == "ORDER":
+            response = await self.handle_inquiry(context)
+        elif classification == "ORDER":
             # Handle orders with inventory and sales agents
-            response = self.handle_order(context)
+            response = await self.handle_order(context)
         else:
             response = "Invalid classification received from orchestration agent."
 
@@ -1141,10 +1783,78 @@ class MultiAgentWorkflow:
 
 # Run your test scenarios by writing them here. Make sure to keep track of them.
 
+# Maximum number of customer requests processed concurrently (caps parallel OpenAI calls)
+MAX_CONCURRENT_REQUESTS = 8
+
+# Scenario results are written as each date completes so an interrupted run can be resumed
+TEST_RESULTS_CSV = "test_results.csv"
+TEST_RESULTS_COLUMNS = ["request_id", "request_date", "cash_balance", "inventory_value", "response"]
+results_engine = create_engine("sqlite:///test_results.db")
+
+
+def init_results_database(engine: Engine, reset: bool = True) -> None:
+    """
+    Create the tables holding scenario results and agent usage counts.
 
-def run_test_scenarios():
-    print("Initializing Database...")
-    init_database(db_engine)
+    Args:
+        engine (Engine): SQLAlchemy engine for the results database.
+        reset (bool): If True, delete rows left over from a previous run.
+    """
+    with engine.begin() as conn:
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS test_results (
+                request_id INTEGER PRIMARY KEY,
+                request_date TEXT NOT NULL,
+                cash_balance REAL,
+                inventory_value REAL,
+                response TEXT
+            )
+        """))
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS agent_usage (
+                agent TEXT PRIMARY KEY,
+                count INTEGER NOT NULL
+            )
+        """))
+        if reset:
+            conn.execute(text("DELETE FROM test_results"))
+            conn.execute(text("DELETE FROM agent_usage"))
+
+
+def save_test_result(result: Dict, agent_usage_count: Dict[str, int]) -> None:
+    """
+    Store one scenario result together with the agent usage counts at the time it finished.
+    Counts only ever grow, so a snapshot saved out of order never lowers a stored count.
+
+    Args:
+        result (Dict): Row with the TEST_RESULTS_COLUMNS fields.
+        agent_usage_count (Dict[str, int]): Number of calls per agent so far.
+    """
+    with results_engine.begin() as conn:
+        conn.execute(
+            text("""
+                INSERT INTO test_results (request_id, request_date, cash_balance, inventory_value, response)
+                VALUES (:request_id, :request_date, :cash_balance, :inventory_value, :response)
+            """),
+            result,
+        )
+        conn.execute(
+            text("""
+                INSERT INTO agent_usage (agent, count) VALUES (:agent, :count)
+                ON CONFLICT(agent) DO UPDATE SET count = MAX(count, excluded.count)
+            """),
+            [{"agent": agent, "count": count} for agent, count in agent_usage_count.items()],
+        )
+
+
+async def _run_test_scenarios_async(resume: bool = False, streaming: bool = False):
+    if resume:
+        # Keep the inventory database as it is; it already reflects the completed requests
+        logger.info("Resuming previous run...")
+    else:
+        logger.info("Initializing Database...")
+        init_database(db_engine)
+    init_results_database(results_engine, reset=not resume)
     try:
         quote_requests_sample = pd.read_csv("quote_requests_sample.csv")
         quote_requests_sample["request_date"] = pd.to_datetime(
@@ -1153,19 +1863,19 @@ def run_test_scenarios():
         quote_requests_sample.dropna(subset=["request_date"], inplace=True)
         quote_requests_sample = quote_requests_sample.sort_values("request_date")
     except Exception as e:
-        print(f"FATAL: Error loading test data: {e}")
+        logger.error("FATAL: Error loading test data: %s", e)
         return
 
-    quote_requests_sample = pd.read_csv("quote_requests_sample.csv")
-
-    # Sort by date
-    quote_requests_sample["request_date"] = pd.to_datetime(
-        quote_requests_sample["request_date"]
+    # Precompute date strings and dated request texts for all rows at once
+    quote_requests_sample["request_date_str"] = quote_requests_sample["request_date"].dt.strftime("%Y-%m-%d")
+    quote_requests_sample["request_with_date"] = (
+            quote_requests_sample["request"] + " (Date of request: " + quote_requests_sample["request_date_str"] + ")"
     )
-    quote_requests_sample = quote_requests_sample.sort_values("request_date")
+    # Agents estimate deliveries from the request dates, so compute those lookups up front
+    precompute_supplier_delivery_dates(quote_requests_sample["request_date"])
 
     # Get initial state
-    initial_date = quote_requests_sample["request_date"].min().strftime("%Y-%m-%d")
+    initial_date = quote_requests_sample["request_date_str"].iloc[0]
     report = generate_financial_report(initial_date)
     current_cash = report["cash_balance"]
     current_inventory = report["inventory_value"]
@@ -1178,66 +1888,107 @@ def run_test_scenarios():
     ############
     ############
     multi_agent_workflow = MultiAgentWorkflow()
-
-    results = []
-    for idx, row in quote_requests_sample.iterrows():
-        request_date = row["request_date"].strftime("%Y-%m-%d")
-
-        print(f"\n=== Request {idx + 1} ===")
-        print(f"Context: {row['job']} organizing {row['event']}")
-        print(f"Request Date: {request_date}")
-        print(f"Cash Balance: ${current_cash:.2f}")
-        print(f"Inventory Value: ${current_inventory:.2f}")
-
-        # Process request
-        request_with_date = f"{row['request']} (Date of request: {request_date})"
-
-        ############
-        ############
-        ############
-        # USE YOUR MULTI AGENT SYSTEM TO HANDLE THE REQUEST
-        ############
-        ############
-        ############
-
-        response = multi_agent_workflow.run(request_with_date)
-
-        # Update state
-        report = generate_financial_report(request_date)
-        current_cash = report["cash_balance"]
-        current_inventory = report["inventory_value"]
-
-        print(f"Response: {response}")
-        print(f"Updated Cash: ${current_cash:.2f}")
-        print(f"Updated Inventory: ${current_inventory:.2f}")
-
-        results.append(
-            {
-                "request_id": idx + 1,
-                "request_date": request_date,
-                "cash_balance": current_cash,
-                "inventory_value": current_inventory,
+    with results_engine.connect() as conn:
+        completed_ids = set(conn.execute(text("SELECT request_id FROM test_results")).scalars())
+        for agent, count in conn.execute(text("SELECT agent, count FROM agent_usage")):
+            multi_agent_workflow.agent_usage_count[agent] = count
+    pending_requests = quote_requests_sample[~(quote_requests_sample.index + 1).isin(completed_ids)].copy()
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+
+    # Classify all pending requests up front, once per distinct request text; the date note is left
+    # out because it does not change the classification
+    classifications = await multi_agent_workflow.classify_many(pending_requests["request"].tolist(), semaphore)
+    pending_requests["classification"] = pending_requests["request"].map(classifications)
+    order_lock = asyncio.Lock()
+
+    # Line-buffered so every written row reaches the file even if the run is interrupted
+    with open(TEST_RESULTS_CSV, "a" if resume else "w", newline="", buffering=1) as results_file:
+        results_writer = csv.DictWriter(results_file, fieldnames=TEST_RESULTS_COLUMNS)
+        if results_file.tell() == 0:
+            results_writer.writeheader()
+
+        async def process_request(row) -> Dict:
+            ############
+            ############
+            ############
+            # USE YOUR MULTI AGENT SYSTEM TO HANDLE THE REQUEST
+            ############
+            ############
+            ############
+
+            # Orders check stock and record the sale in separate tool calls, so they run one at a time
+            # to avoid overselling; inquiries only read and overlap with everything else
+            request_lock = order_lock if row.classification == "ORDER" else contextlib.nullcontext()
+            async with request_lock:
+                async with semaphore:
+                    logger.info("\n=== Request %d ===", row.Index + 1)
+                    logger.info("Context: %s organizing %s", row.job, row.event)
+                    logger.info("Request Date: %s", row.request_date_str)
+                    response = await multi_agent_workflow.run(
+                        row.request_with_date, streaming=streaming, classification=row.classification
+                    )
+                # State right after this request, taken before the next order can change it; the
+                # queries run in a worker thread so other requests keep going meanwhile
+                report = await asyncio.to_thread(generate_financial_report, row.request_date_str)
+
+            # Persist each request as soon as it finishes, so a resumed run only repeats requests
+            # whose transactions were not recorded yet
+            result = {
+                "request_id": row.Index + 1,
+                "request_date": row.request_date_str,
+                "cash_balance": report["cash_balance"],
+                "inventory_value": report["inventory_value"],
                 "response": response,
             }
-        )
-
-        time.sleep(1)
+            await asyncio.to_thread(save_test_result, result, dict(multi_agent_workflow.agent_usage_count))
+            results_writer.writerow(result)
+            return result
+
+        # Inquiries sharing a date run concurrently while that date's orders run one after another;
+        # dates are processed in order so that stock and cash changes from earlier days are visible
+        # to later requests
+        for request_date, day_requests in pending_requests.groupby("request_date_str", sort=True):
+            logger.info("Cash Balance: $%.2f", current_cash)
+            logger.info("Inventory Value: $%.2f", current_inventory)
+
+            day_rows = list(day_requests.itertuples())
+            day_results = await asyncio.gather(*(process_request(row) for row in day_rows))
+            for result in day_results:
+                logger.info("Response (%d): %s", result["request_id"], result["response"])
+
+            # Orders run one after another in list order and inquiries leave stock and cash untouched,
+            # so the day's last order (or any request on a day without orders) holds the end-of-day state
+            day_orders = [result for row, result in zip(day_rows, day_results) if row.classification == "ORDER"]
+            end_of_day = (day_orders or day_results)[-1]
+            current_cash = end_of_day["cash_balance"]
+            current_inventory = end_of_day["inventory_value"]
+            logger.info("Updated Cash: $%.2f", current_cash)
+            logger.info("Updated Inventory: $%.2f", current_inventory)
 
     # Final report
-    final_date = quote_requests_sample["request_date"].max().strftime("%Y-%m-%d")
-    final_report = generate_financial_report(final_date)
-    print("\n===== FINAL FINANCIAL REPORT =====")
-    print(f"Final Cash: ${final_report['cash_balance']:.2f}")
-    print(f"Final Inventory: ${final_report['inventory_value']:.2f}")
-
-    print("\n===== Agent Usage Summary =====")
+    final_date = quote_requests_sample["request_date_str"].iloc[-1]
+    if pending_requests.empty or pending_requests["request_date_str"].iloc[-1] != final_date:
+        # The final date was finished in an earlier run, so its state was not tracked above
+        final_report = generate_financial_report(final_date)
+        current_cash = final_report["cash_balance"]
+        current_inventory = final_report["inventory_value"]
+    logger.info("\n===== FINAL FINANCIAL REPORT =====")
+    logger.info("Final Cash: $%.2f", current_cash)
+    logger.info("Final Inventory: $%.2f", current_inventory)
+
+    logger.info("\n===== Agent Usage Summary =====")
     for agent, count in multi_agent_workflow.agent_usage_count.items():
-        print(f"{agent.capitalize()} Agent: {count} times")
+        logger.info("%s Agent: %d times", agent.capitalize(), count)
+
+    return pd.read_sql("SELECT * FROM test_results ORDER BY request_id", results_engine).to_dict("records")
+
 
-    # Save results
-    pd.DataFrame(results).to_csv("test_results.csv", index=False)
-    return results
+def run_test_scenarios(resume: bool = False, streaming: Union[bool, None] = None):
+    if streaming is None:
+        streaming = streaming_enabled()
+    return asyncio.run(_run_test_scenarios_async(resume=resume, streaming=streaming))
 
 
 if __name__ == "__main__":
+    configure_logging()
     results = run_test_scenarios()
@@ -0,0 +1,296 @@
+import asyncio
+import contextlib
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+from pydantic_ai.models.test import TestModel
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# The databases and result files are created relative to the working directory, so the
+# tests run in a scratch copy of the input data
+os.environ.setdefault("OPENAI_API_KEY", "test")
+WORKDIR = tempfile.mkdtemp(prefix="beaver-tests-")
+for name in ("quote_requests.csv", "quotes.csv", "quote_requests_sample.csv"):
+    shutil.copy(ROOT / name, WORKDIR)
+os.chdir(WORKDIR)
+sys.path.insert(0, str(ROOT))
+
+import project_starter as ps  # noqa: E402
+
+
+def override_agents(stack: contextlib.ExitStack, outputs: dict) -> None:
+    """Replace every agent's model with a TestModel returning the given output per role."""
+    for role, factory in ps.MultiAgentWorkflow().agents.items():
+        model = TestModel(call_tools=[], custom_output_args=outputs.get(role))
+        stack.enter_context(factory().override(model=model))
+
+
+class ConfigureLoggingTest(unittest.TestCase):
+    def tearDown(self):
+        for handler in list(ps.logger.handlers):
+            ps.logger.removeHandler(handler)
+            handler.close()
+        ps.logger.setLevel(ps.logging.NOTSET)
+
+    def test_repeated_calls_keep_a_single_handler(self):
+        ps.configure_logging("warning")
+        ps.configure_logging("debug")
+
+        self.assertEqual(len(ps.logger.handlers), 1)
+        self.assertEqual(ps.logger.level, ps.logging.DEBUG)
+
+    def test_level_from_environment_is_case_insensitive(self):
+        with mock.patch.dict(os.environ, {"LOG_LEVEL": "error"}):
+            ps.configure_logging()
+
+        self.assertEqual(ps.logger.level, ps.logging.ERROR)
+
+
+class ClassifyByKeywordsTest(unittest.TestCase):
+    def test_first_person_purchase_intent_is_an_order(self):
+        for request in (
+                "I would like to place an order for 500 sheets of A4 paper.",
+                "We'd like to buy 200 sheets of cardstock, delivered by April 15.",
+                "I need to order 1000 flyers for our concert.",
+                "We are ready to proceed with the quoted order.",
+        ):
+            with self.subTest(request=request):
+                self.assertEqual(ps.classify_by_keywords(request), "ORDER")
+
+    def test_availability_question_is_an_inquiry(self):
+        for request in (
+                "Do you have A4 glossy paper in stock?",
+                "Is cardstock available for delivery by April 10?",
+                "Before we purchase anything, could you confirm whether 500 sheets of A4 paper are available?",
+        ):
+            with self.subTest(request=request):
+                self.assertEqual(ps.classify_by_keywords(request), "INQUIRY")
+
+    def test_ambiguous_requests_are_left_to_the_llm(self):
+        for request in (
+                "What price did you quote customers who wanted to buy glossy paper?",
+                "We'd like to buy A4 paper, is it in stock?",
+                "Please send 300 sheets of cardstock.",
+        ):
+            with self.subTest(request=request):
+                self.assertIsNone(ps.classify_by_keywords(request))
+
+
+class InitDatabaseTest(unittest.TestCase):
+    def test_header_only_quote_requests_csv_creates_an_empty_table(self):
+        self.addCleanup(shutil.copy, ROOT / "quote_requests.csv", WORKDIR)
+        with open(ROOT / "quote_requests.csv") as source, open("quote_requests.csv", "w") as target:
+            target.write(source.readline())
+
+        ps.init_database(ps.db_engine)
+
+        with ps.db_engine.connect() as conn:
+            self.assertEqual(conn.execute(ps.text("SELECT COUNT(*) FROM quote_requests")).scalar(), 0)
+        self.assertEqual(ps.search_quote_history(["paper"]), [])
+
+
+class SearchQuoteHistoryTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        ps.init_database(ps.db_engine)
+
+    def test_terms_also_match_longer_word_forms(self):
+        results = ps.search_quote_history(["napkin"], limit=50)
+
+        self.assertTrue(results)
+        self.assertTrue(any("napkins" in result["original_request"].lower() for result in results))
+
+
+class ComplexityRouterTest(unittest.TestCase):
+    def test_router_returns_model_names_resolved_on_use(self):
+        self.assertEqual(ps.complexity_router("Please send 100 sheets of A4 paper."), ps.QUOTING_FAST_MODEL)
+        self.assertEqual(
+            ps.complexity_router("Urgent: we need 5000 sheets of custom cardstock."), ps.QUOTING_SLOW_MODEL
+        )
+        self.assertIs(ps.openai_model(ps.QUOTING_FAST_MODEL), ps.openai_model(ps.QUOTING_FAST_MODEL))
+
+
+class ClassifyManyTest(unittest.TestCase):
+    def test_classifications_are_limited_by_the_semaphore(self):
+        running = 0
+        max_running = 0
+
+        async def slow_classify(workflow, context):
+            nonlocal running, max_running
+            running += 1
+            max_running = max(max_running, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            return "INQUIRY"
+
+        async def classify_batch():
+            requests = [f"Question number {i} about paper" for i in range(10)]
+            return await ps.MultiAgentWorkflow().classify_many(requests, asyncio.Semaphore(2))
+
+        with mock.patch.object(ps.MultiAgentWorkflow, "classify", autospec=True, side_effect=slow_classify):
+            classifications = asyncio.run(classify_batch())
+
+        self.assertEqual(max_running, 2)
+        self.assertEqual(set(classifications.values()), {"INQUIRY"})
+
+    def test_near_duplicates_are_classified_once(self):
+        with mock.patch.object(ps.MultiAgentWorkflow, "classify", autospec=True, return_value="ORDER") as classify:
+            classifications = asyncio.run(ps.MultiAgentWorkflow().classify_many(
+                ["Please send A4 paper.", "please send a4 paper", "Please send cardstock."]
+            ))
+
+        self.assertEqual(classify.call_count, 2)
+        self.assertEqual(len(classifications), 3)
+
+
+class StreamingOrderTest(unittest.TestCase):
+    def quote_contexts(self, inventory_answer: str, details_changed: bool) -> list:
+        quote_contexts = []
+
+        async def fake_quoting(workflow, context, order_context, quote_history):
+            quote_contexts.append("\n".join(order_context))
+            return SimpleNamespace(output="Quote: $50.00")
+
+        with contextlib.ExitStack() as stack:
+            override_agents(stack, {"inventory": {
+                "proceed_with_order": True, "details_changed": details_changed, "answer": inventory_answer
+            }})
+            stack.enter_context(
+                mock.patch.object(ps.MultiAgentWorkflow, "_run_quoting", autospec=True, side_effect=fake_quoting)
+            )
+            asyncio.run(ps.MultiAgentWorkflow().run(
+                "I would like to order 100 sheets of A4 paper", streaming=True, classification="ORDER"
+            ))
+        return quote_contexts
+
+    def test_quote_waits_for_inventory_details_when_they_change(self):
+        quote_contexts = self.quote_contexts("Only 50 in stock; restock arrives 2025-04-20", details_changed=True)
+
+        self.assertEqual(len(quote_contexts), 1)
+        self.assertIn("Only 50 in stock; restock arrives 2025-04-20", quote_contexts[0])
+
+    def test_speculative_quote_is_kept_when_final_answer_adds_nothing(self):
+        quote_contexts = self.quote_contexts("All 100 sheets can be shipped immediately.", details_changed=False)
+
+        self.assertEqual(len(quote_contexts), 1)
+        self.assertIn(ps.SPECULATIVE_INVENTORY_CONTEXT, quote_contexts[0])
+
+
+class HandleOrderCleanupTest(unittest.TestCase):
+    def test_quote_history_lookup_is_cancelled_when_inventory_step_fails(self):
+        lookup_started = asyncio.Event()
+        lookup_cancelled = False
+
+        async def slow_lookup(customer_request):
+            nonlocal lookup_cancelled
+            lookup_started.set()
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                lookup_cancelled = True
+                raise
+
+        async def failing_inventory(*args, **kwargs):
+            await lookup_started.wait()
+            raise RuntimeError("inventory agent failed")
+
+        async def run_order():
+            workflow = ps.MultiAgentWorkflow()
+            with mock.patch.object(workflow, "_prefetch_quote_history", side_effect=slow_lookup), \
+                    mock.patch.object(ps._build_inventory_agent(), "run", side_effect=failing_inventory):
+                with self.assertRaises(RuntimeError):
+                    await workflow.run("I would like to order 100 sheets of A4 paper", classification="ORDER")
+            await asyncio.sleep(0)
+
+        asyncio.run(run_order())
+
+        self.assertTrue(lookup_cancelled)
+
+
+class InvoiceUsageCountTest(unittest.TestCase):
+    def test_locally_rendered_invoice_does_not_count_as_agent_call(self):
+        workflow = ps.MultiAgentWorkflow()
+        with contextlib.ExitStack() as stack:
+            override_agents(stack, {
+                "inventory": {"proceed_with_order": True, "details_changed": False, "answer": "All items are in stock."},
+                "sales": {
+                    "answer": "Thank you for your order.",
+                    "line_items": [{"item_name": "A4 paper", "quantity": 100, "unit_price": 0.05}],
+                    "discount_amount": 0.0,
+                    "order_date": "2025-04-01",
+                    "delivery_date": "2025-04-02",
+                },
+            })
+            response = asyncio.run(workflow.run("I would like to order 100 sheets of A4 paper"))
+
+        self.assertIn("INVOICE", response.upper())
+        self.assertEqual(workflow.agent_usage_count["invoice"], 0)
+        self.assertEqual(workflow.agent_usage_count["sales"], 1)
+
+
+class RunTestScenariosTest(unittest.TestCase):
+    def run_inquiries(self, resume: bool = False) -> list:
+        with contextlib.ExitStack() as stack:
+            override_agents(stack, {
+                "orchestration": {"classification": "INQUIRY"},
+                "inventory": {"proceed_with_order": True, "details_changed": False, "answer": "All items are in stock."},
+            })
+            stack.enter_context(mock.patch.object(ps, "classify_by_keywords", return_value=None))
+            return ps.run_test_scenarios(resume=resume)
+
+    def test_inquiry_responses_are_persisted_as_text(self):
+        results = self.run_inquiries()
+
+        self.assertEqual(len(results), 20)
+        self.assertTrue(all(result["response"] == "All items are in stock." for result in results))
+
+    def test_orders_run_one_at_a_time_and_record_their_own_report(self):
+        running_orders = 0
+        max_running_orders = 0
+
+        async def sell_one_unit(workflow, customer_request, streaming=False, classification=None):
+            nonlocal running_orders, max_running_orders
+            running_orders += 1
+            max_running_orders = max(max_running_orders, running_orders)
+            await asyncio.sleep(0.01)
+            request_date = customer_request.rsplit("Date of request: ", 1)[1].rstrip(")")
+            ps.create_transaction("A4 paper", "sales", 1, 10.0, request_date)
+            running_orders -= 1
+            return "sold"
+
+        with mock.patch.object(ps, "classify_by_keywords", return_value="ORDER"), \
+                mock.patch.object(ps.MultiAgentWorkflow, "run", autospec=True, side_effect=sell_one_unit), \
+                mock.patch.object(ps, "generate_financial_report", wraps=ps.generate_financial_report) as report:
+            results = ps.run_test_scenarios()
+
+        self.assertEqual(max_running_orders, 1)
+        # One report for the starting state and one per request; per-date and final state reuse those
+        self.assertEqual(report.call_count, 21)
+        # Every sale adds 10.0 in cash, so each row reflects exactly the sales made up to that request
+        cash_balances = sorted(result["cash_balance"] for result in results)
+        self.assertEqual(len(set(cash_balances)), 20)
+        for previous, current in zip(cash_balances, cash_balances[1:]):
+            self.assertAlmostEqual(current - previous, 10.0)
+
+    def test_resume_only_runs_unfinished_requests(self):
+        self.run_inquiries()
+        with ps.results_engine.begin() as conn:
+            conn.execute(ps.text("DELETE FROM test_results WHERE request_id > 15"))
+
+        with mock.patch.object(ps.MultiAgentWorkflow, "run", autospec=True, return_value="resumed") as run:
+            results = ps.run_test_scenarios(resume=True)
+
+        self.assertEqual(run.call_count, 5)
+        self.assertEqual([result["request_id"] for result in results], list(range(1, 21)))
+        self.assertEqual([result["response"] for result in results[15:]], ["resumed"] * 5)
+
+
+if __name__ == "__main__":
+    unittest.main()